@@ -1,3 +1,4 @@
+from ._client import CucmConnection
 from .axl import axl
 from .ccs import ccs
 from .cdr import cdr
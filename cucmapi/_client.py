@@ -0,0 +1,572 @@
+import os
+import re
+import time
+from io import BytesIO
+from contextlib import contextmanager
+from functools import lru_cache
+from importlib.util import find_spec
+from lxml import etree
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+from requests import Response, Session
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+from urllib3.util.retry import Retry
+from zeep import AsyncClient, Client, Settings
+from zeep.cache import SqliteCache
+from zeep.exceptions import Fault, TransportError
+from zeep.proxy import AsyncServiceProxy
+from zeep.transports import AsyncTransport, Transport
+
+# httpx is an optional dependency (zeep[async]), only needed for the asyncio variants of the methods
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# httpx only speaks HTTP/2 if the h2 package is installed, e.g. `pip install httpx[http2]`
+HTTP2 = find_spec("h2") is not None
+
+
+# local copies of the WSDL files (and the XSD files they import) are kept here
+# set CUCMAPI_CACHE_DIR to use a different directory, e.g. one with pre-fetched WSDL files
+CACHE_DIR = Path(os.environ.get("CUCMAPI_CACHE_DIR") or Path.home() / ".cache" / "cucmapi")
+
+# the schema documents only change with a CUCM upgrade, local copies older than this are revalidated
+_WSDL_MAX_AGE = 30 * 86400
+
+WSDL_NS = {"wsdl": "http://schemas.xmlsoap.org/wsdl/"}
+SOAP_ENV_NS = "http://schemas.xmlsoap.org/soap/envelope/"
+XSI_NIL = "{http://www.w3.org/2001/XMLSchema-instance}nil"
+
+# connections kept per CUCM node, by the requests pool and by the httpx clients
+# (with HTTP/2 one connection carries all calls, the limit applies if httpx falls back to HTTP/1.1)
+_POOL_SIZE = 32
+
+# parser for the responses parsed without zeep, created once and reused for every response
+_PARSER = etree.XMLParser(huge_tree=True, collect_ids=False, remove_blank_text=True)
+
+
+class TunedSqliteCache(SqliteCache):
+    """
+    zeep SqliteCache with SQLite tuned for a small, read-mostly cache.
+    WAL journaling with synchronous=NORMAL avoids an fsync on every write.
+    The journal mode is stored in the database file and only set once, zeep opens
+    a new connection for every cache access, so the other pragmas are applied to each of them.
+    """
+
+    PRAGMAS = (
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA temp_store=MEMORY",
+    )
+
+    @contextmanager
+    def db_connection(self):
+        with super().db_connection() as connection:
+            for pragma in self.PRAGMAS:
+                connection.execute(pragma)
+            yield connection
+
+    def __init__(self, path=None, timeout=3600):
+        super().__init__(path=path, timeout=timeout)
+        with self.db_connection() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS validators (url text PRIMARY KEY, etag text, last_modified text)"
+            )
+            connection.commit()
+
+    def add_validators(self, url, etag, last_modified):
+        """
+        Store the ETag and Last-Modified headers of a download, see _download().
+        """
+        with self.db_connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO validators (url, etag, last_modified) VALUES (?, ?, ?)",
+                (url, etag, last_modified)
+            )
+            connection.commit()
+
+    def get_validators(self, url):
+        """
+        Return the ETag and Last-Modified headers stored for a url.
+
+        :param url: url of the downloaded file
+        :return: tuple of etag, last_modified or None if nothing is stored
+        """
+        with self.db_connection() as connection:
+            return connection.execute(
+                "SELECT etag, last_modified FROM validators WHERE url = ?", (url,)
+            ).fetchone()
+
+
+@lru_cache(maxsize=None)
+def _wsdl_cache():
+    """
+    Return the cache shared by all clients, stored next to the local WSDL copies.
+    zeep caches the documents it loads over HTTP(S) for 30 days, local files are read from disk,
+    see LocalFileTransport. The validators of the downloads are stored in it as well, see _download().
+    """
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    return TunedSqliteCache(path=str(CACHE_DIR / "wsdl_cache.db"), timeout=_WSDL_MAX_AGE)
+
+
+def _local_name(url):
+    """
+    Turn the url of a WSDL/XSD file into a file name for the local copy.
+    e.g. 'https://cucm:8443/.../ControlCenterServices?wsdl' -> 'ControlCenterServices_wsdl'
+    """
+    parts = urlsplit(url)
+    name = parts.path.rstrip("/").rsplit("/", 1)[-1]
+    if parts.query:
+        name = f"{name}_{parts.query}"
+    return re.sub(r"[^\w.-]", "_", name)
+
+
+def _trim_wsdl(root, binding_name):
+    """
+    Remove everything from a WSDL document the given binding doesn't use: the other bindings,
+    their port types and messages, and the services (the address is set by create_service()).
+    Fewer elements means less work when zeep parses the document.
+    Documents that don't define the binding themselves are left untouched.
+    """
+    binding_name = etree.QName(binding_name)
+    if root.get("targetNamespace") != binding_name.namespace:
+        return
+    bindings = root.findall("wsdl:binding", WSDL_NS)
+    used = [binding for binding in bindings if binding.get("name") == binding_name.localname]
+    if not used:
+        return
+    binding = used[0]
+    port_type_name = binding.get("type").split(":")[-1]
+    port_types = root.findall("wsdl:portType", WSDL_NS)
+
+    # messages referenced by the binding (e.g. soap headers) or by the operations of its port type
+    used_messages = set()
+    for node in binding.iter(etree.Element):
+        if node.get("message"):
+            used_messages.add(node.get("message").split(":")[-1])
+    for port_type in port_types:
+        if port_type.get("name") == port_type_name:
+            for node in port_type.iterfind("wsdl:operation/*[@message]", WSDL_NS):
+                used_messages.add(node.get("message").split(":")[-1])
+
+    for node in bindings:
+        if node is not binding:
+            root.remove(node)
+    for node in port_types:
+        if node.get("name") != port_type_name:
+            root.remove(node)
+    for node in root.findall("wsdl:message", WSDL_NS):
+        if node.get("name") not in used_messages:
+            root.remove(node)
+    for node in root.findall("wsdl:service", WSDL_NS):
+        root.remove(node)
+
+
+def _download(session, url, target, seen, binding_name=None):
+    """
+    Download a WSDL/XSD file to the target directory, including all files it imports or includes.
+    The references to the imported files are rewritten to point to the local copies.
+    The document itself is written last, so an interrupted download never leaves
+    an incomplete set of files behind.
+    Existing copies are revalidated with a conditional GET, a '304 Not Modified' answer
+    keeps the copy (and the files it imports) instead of transferring it again.
+    """
+    cache = _wsdl_cache()
+    path = target / _local_name(url)
+    validators = cache.get_validators(url) if path.exists() else None
+    headers = {}
+    if validators:
+        etag, last_modified = validators
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+    response = session.get(url, headers=headers, timeout=10)
+    if validators and response.status_code == 304:
+        # restart the age of the copy, see _ensure_local_wsdl()
+        path.touch()
+        return path
+    response.raise_for_status()
+    root = etree.fromstring(response.content)
+    if binding_name:
+        _trim_wsdl(root, binding_name)
+
+    for node in root.iter(etree.Element):
+        if etree.QName(node).localname not in ("import", "include", "redefine"):
+            continue
+        for attribute in ("location", "schemaLocation"):
+            reference = node.get(attribute)
+            if not reference:
+                continue
+            absolute = urljoin(url, reference)
+            node.set(attribute, _local_name(absolute))
+            if absolute not in seen:
+                seen.add(absolute)
+                _download(session, absolute, target, seen)
+
+    path.write_bytes(etree.tostring(root, xml_declaration=True, encoding="UTF-8"))
+    cache.add_validators(url, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+    return path
+
+
+def _ensure_local_wsdl(session, url, cucm_version, binding_name=None):
+    """
+    Return the file:// url of the local copy of a remote WSDL file.
+    The WSDL is only downloaded once per CUCM node and version, subsequent calls
+    load it from disk and skip the HTTPS round-trips entirely.
+    Copies older than 30 days are revalidated with a conditional GET, see _download().
+
+    :param session: requests Session used for the download
+    :param url: url of the remote WSDL file
+    :param cucm_version: CUCM version, part of the cache path so an upgrade fetches a new copy
+    :param binding_name: optional QName of the only binding that is used, the local copy is trimmed to it
+    :return: file:// url of the local copy
+    """
+    target = CACHE_DIR / urlsplit(url).hostname / cucm_version
+    path = target / _local_name(url)
+    if path.exists() and time.time() - path.stat().st_mtime < _WSDL_MAX_AGE:
+        return path.as_uri()
+    target.mkdir(parents=True, exist_ok=True)
+    return _download(session, url, target, {url}, binding_name).as_uri()
+
+
+class LocalFileTransport(Transport):
+    """
+    zeep Transport that reads file:// urls from disk on every load instead of caching them.
+    The WSDL files shipped with the package change with an upgrade, and the local copies
+    of remote WSDL files when they are revalidated, a cached copy would hide both.
+    """
+
+    def load(self, url):
+        if urlsplit(url).scheme == "file":
+            return self._load_remote_data(url)
+        return super().load(url)
+
+
+class HttpxTransport(LocalFileTransport):
+    """
+    zeep Transport that sends the SOAP requests with httpx, which can speak HTTP/2.
+    With HTTP/2, concurrent calls are multiplexed as streams over a single TLS connection
+    instead of queueing on or opening HTTP/1.1 connections. httpx falls back to HTTP/1.1
+    if the server doesn't negotiate HTTP/2 (ALPN).
+    WSDL and XSD files are still loaded through the requests session, which handles file:// urls.
+    """
+
+    def __init__(self, http_client, **kwargs):
+        """
+        :param http_client: httpx.Client used for the SOAP requests
+        :param kwargs: passed on to zeep Transport
+        """
+        super().__init__(**kwargs)
+        self.http_client = http_client
+
+    def get(self, address, params, headers):
+        response = self.http_client.get(address, params=params, headers=headers, timeout=self.operation_timeout)
+        return _to_requests_response(response)
+
+    def post(self, address, message, headers):
+        response = self.http_client.post(address, content=message, headers=headers, timeout=self.operation_timeout)
+        return _to_requests_response(response)
+
+
+class Record(dict):
+    """
+    dict with the fields of a response item parsed without zeep.
+    The fields can be read as attributes, too, like those of the objects zeep returns, e.g. service.ServiceName
+    """
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+def _xsd_fields(xsd_type):
+    """
+    Map the child elements of a zeep complex type to (fields, multiple), recursively, for _typed_record().
+    Simple types are mapped to their pythonvalue() instead, which converts the text of an element.
+    """
+    if not hasattr(xsd_type, "elements"):
+        return xsd_type.pythonvalue
+    return {name: (_xsd_fields(element.type), element.accepts_multiple) for name, element in xsd_type.elements}
+
+
+def _typed_record(element, fields):
+    """
+    Turn an element parsed without zeep into a Record with the values zeep would return, e.g. int for
+    xsd:unsignedInt and a list for repeated elements. fields is the mapping returned by _xsd_fields().
+    Missing elements are None (or an empty list), unknown elements are skipped.
+    """
+    record = Record((name, [] if multiple else None) for name, (_, multiple) in fields.items())
+    for child in element:
+        name = etree.QName(child).localname
+        if name not in fields or child.get(XSI_NIL) == "true":
+            continue
+        convert, multiple = fields[name]
+        if isinstance(convert, dict):
+            value = _typed_record(child, convert)
+        elif child.text is None:
+            value = None
+        else:
+            try:
+                value = convert(child.text)
+            except (TypeError, ValueError):
+                value = None
+        if multiple:
+            record[name].append(value)
+        else:
+            record[name] = value
+    return record
+
+
+def _httpx_limits():
+    """
+    Pool limits of the httpx clients, the same size as the requests pool.
+    """
+    return httpx.Limits(max_connections=_POOL_SIZE, max_keepalive_connections=_POOL_SIZE)
+
+
+def _to_requests_response(response):
+    """
+    Convert a httpx Response into the requests Response zeep expects.
+    """
+    new = Response()
+    new._content = response.content
+    new.status_code = response.status_code
+    new.headers = response.headers
+    new.encoding = response.encoding
+    return new
+
+
+def _soap_body(response):
+    """
+    Return the response element inside the SOAP Body of a response to a prebuilt envelope, see post_soap().
+    SOAP faults are raised as zeep Fault.
+    """
+    try:
+        root = etree.fromstring(response.content, _PARSER)
+    except etree.XMLSyntaxError:
+        raise TransportError(status_code=response.status_code, content=response.content)
+    body = root.find(f"{{{SOAP_ENV_NS}}}Body")
+    fault = body.find(f"{{{SOAP_ENV_NS}}}Fault") if body is not None else None
+    if fault is not None:
+        raise Fault(message=fault.findtext("faultstring"), code=fault.findtext("faultcode"))
+    if response.status_code != 200 or body is None or not len(body):
+        raise TransportError(status_code=response.status_code, content=response.content)
+    return body[0]
+
+
+class CucmConnection(object):
+    """
+    The HTTPS connection to one CUCM node, shared by the API classes.
+    It owns the requests Session with its keep-alive connection pool, the zeep
+    Transport and Settings, and the parsed WSDL clients. API classes created with
+    the same connection, e.g. ccs and cdr, reuse the same TLS connections.
+    """
+
+    def __init__(self, username, password, cucm, cucm_version, http2=False):
+        """
+        :param username: axl username
+        :param password: axl password
+        :param cucm: fqdn or IP address of CUCM
+        :param cucm_version: CUCM version
+        :param http2: send the SOAP requests over HTTP/2 to multiplex concurrent calls over one connection.
+                      Requires the optional httpx and h2 packages, e.g. `pip install httpx[http2]`
+        """
+
+        # create a session
+        session = Session()
+
+        # disable certificate verification
+        session.verify = False
+
+        # to enable SSL cert verification, copy the CUCM tomcat .pem file and uncomment the following lines
+        # CERT = 'cucmtomcat.pem'
+        # session.verify = CERT
+
+        session.auth = HTTPBasicAuth(username, password)
+
+        # keep connections to the CUCM alive and pool them, so bursts of SOAP calls
+        # don't pay for a new TCP+TLS handshake every time
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=_POOL_SIZE,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+        )
+        session.mount("https://", adapter)
+        session.headers.update({"Connection": "keep-alive"})
+
+        self.username = username
+        self.password = password
+        self.cucm = cucm
+        self.cucm_version = cucm_version
+        self.http2 = http2
+        self.session = session
+        if http2:
+            if httpx is None or not HTTP2:
+                raise RuntimeError("HTTP/2 requires httpx and h2, e.g. `pip install httpx[http2]`")
+            http_client = httpx.Client(auth=(username, password), verify=False, http2=True, limits=_httpx_limits())
+            self.transport = HttpxTransport(http_client, session=session, timeout=10, cache=_wsdl_cache())
+        else:
+            self.transport = LocalFileTransport(session=session, timeout=10, cache=_wsdl_cache())
+        self.settings = Settings(strict=False, xml_huge_tree=True, xsd_ignore_sequence_order=True)
+        self._clients = {}
+        self._services = {}
+        self._async_clients = {}
+        self._async_transport = None
+
+    def for_node(self, cucm):
+        """
+        Return a new connection to another node of the cluster, with the credentials and options of this one.
+
+        :param cucm: fqdn or IP address of the node
+        :return: CucmConnection
+        """
+        return CucmConnection(self.username, self.password, cucm, self.cucm_version, http2=self.http2)
+
+    def client(self, wsdl, binding_name=None):
+        """
+        Return the zeep Client for a WSDL on this CUCM.
+        Downloading and parsing a WSDL is by far the most expensive part of setting up
+        a client, so every WSDL is only parsed once per connection.
+
+        :param wsdl: url of the WSDL file, file:// urls of WSDL files shipped with the package are used as is
+        :param binding_name: optional QName of the only binding that is used, see _trim_wsdl()
+        :return: zeep Client
+        """
+        if wsdl not in self._clients:
+            if urlsplit(wsdl).scheme == "file":
+                location = wsdl
+            else:
+                location = _ensure_local_wsdl(self.session, wsdl, self.cucm_version, binding_name)
+            self._clients[wsdl] = Client(location, settings=self.settings, transport=self.transport)
+        return self._clients[wsdl]
+
+    def service(self, wsdl, binding_name, address):
+        """
+        Return the zeep service for the given binding, see Client.create_service().
+        The service is created once per connection and shared by all instances of the API classes.
+
+        :param wsdl: url of the WSDL file
+        :param binding_name: QName of the binding
+        :param address: address of the endpoint
+        :return: zeep ServiceProxy
+        """
+        key = (wsdl, binding_name, address)
+        if key not in self._services:
+            self._services[key] = self.client(wsdl, binding_name).create_service(binding_name, address)
+        return self._services[key]
+
+    def async_client(self, wsdl, binding_name=None):
+        """
+        Return the zeep AsyncClient for a WSDL on this CUCM, to run calls concurrently with asyncio.
+        The WSDL isn't parsed again, the AsyncClient reuses the document parsed by client().
+        Requires the optional httpx package; HTTP/2 is used if the h2 package is installed, too.
+
+        :param wsdl: url of the WSDL file
+        :param binding_name: optional QName of the only binding that is used, see _trim_wsdl()
+        :return: zeep AsyncClient
+        """
+        if wsdl not in self._async_clients:
+            self._async_clients[wsdl] = AsyncClient(
+                self.client(wsdl, binding_name).wsdl, settings=self.settings, transport=self._get_async_transport()
+            )
+        return self._async_clients[wsdl]
+
+    def async_service(self, wsdl, binding_name, address):
+        """
+        Create an asyncio service for the given binding, the async counterpart of Client.create_service().
+        AsyncClient.create_service() returns a synchronous ServiceProxy, so the proxy is created here.
+
+        :param wsdl: url of the WSDL file
+        :param binding_name: QName of the binding
+        :param address: address of the endpoint
+        :return: zeep AsyncServiceProxy
+        """
+        client = self.async_client(wsdl, binding_name)
+        return AsyncServiceProxy(client, client.wsdl.bindings[binding_name], address=address)
+
+    def post_soap(self, address, envelope, soap_action):
+        """
+        POST a prebuilt SOAP envelope and return the response element inside the SOAP Body.
+        Used by the hot methods to skip zeep's serializer and deserializer. The request still
+        goes through the transport, so it shares the connection pool (or HTTP/2 connection).
+        SOAP faults are raised as zeep Fault, like the zeep services do.
+
+        :param address: address of the endpoint
+        :param envelope: SOAP envelope string
+        :param soap_action: value of the SOAPAction header, see the soapaction of the operation in the binding
+        :return: lxml element, e.g. <soapGetServiceStatusResponse>
+        """
+        return _soap_body(self._post_envelope(address, envelope, soap_action))
+
+    async def post_soap_async(self, address, envelope, soap_action):
+        """
+        asyncio variant of post_soap(), sent with the httpx client of the asyncio services.
+        Requires the optional httpx package.
+
+        :param address: address of the endpoint
+        :param envelope: SOAP envelope string
+        :param soap_action: value of the SOAPAction header, see the soapaction of the operation in the binding
+        :return: lxml element, e.g. <selectCmDeviceExtResponse>
+        """
+        headers = {"Content-Type": "text/xml; charset=utf-8", "SOAPAction": f'"{soap_action}"'}
+        response = await self._get_async_transport().post(address, envelope.encode("utf-8"), headers)
+        return _soap_body(response)
+
+    def iter_soap(self, address, envelope, soap_action, tag):
+        """
+        Like post_soap(), but stream the elements with the given tag out of the response instead of
+        building the whole tree. Every element is cleared once the caller moved on to the next one,
+        so the memory used doesn't grow with the size of the response.
+
+        :param address: address of the endpoint
+        :param envelope: SOAP envelope string
+        :param soap_action: value of the SOAPAction header, see the soapaction of the operation in the binding
+        :param tag: tag of the elements to return, e.g. '{*}item'
+        :return: generator of lxml elements
+        """
+        response = self._post_envelope(address, envelope, soap_action)
+        events = etree.iterparse(
+            BytesIO(response.content), events=("end",), tag=(tag, f"{{{SOAP_ENV_NS}}}Fault"),
+            huge_tree=True, collect_ids=False, remove_blank_text=True
+        )
+        try:
+            for _, element in events:
+                if element.tag == f"{{{SOAP_ENV_NS}}}Fault":
+                    raise Fault(message=element.findtext("faultstring"), code=element.findtext("faultcode"))
+                yield element
+                element.clear()
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+        except etree.XMLSyntaxError:
+            raise TransportError(status_code=response.status_code, content=response.content)
+        if response.status_code != 200:
+            raise TransportError(status_code=response.status_code, content=response.content)
+
+    def _post_envelope(self, address, envelope, soap_action):
+        headers = {"Content-Type": "text/xml; charset=utf-8", "SOAPAction": f'"{soap_action}"'}
+        return self.transport.post(address, envelope.encode("utf-8"), headers)
+
+    def _get_async_transport(self):
+        if httpx is None:
+            raise RuntimeError("The asyncio methods require httpx, e.g. `pip install zeep[async] httpx[http2]`")
+        if self._async_transport is None:
+            # no operation timeout, same as for the synchronous transport
+            http_client = httpx.AsyncClient(
+                auth=(self.username, self.password), verify=False, http2=HTTP2, timeout=None, limits=_httpx_limits()
+            )
+            self._async_transport = AsyncTransport(client=http_client, cache=_wsdl_cache())
+        return self._async_transport
+
+
+@lru_cache(maxsize=32)
+def _get_connection(username, password, cucm, cucm_version):
+    """
+    Return the connection shared by all API classes that use the same CUCM and credentials.
+    """
+    return CucmConnection(username, password, cucm, cucm_version)
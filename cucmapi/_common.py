@@ -0,0 +1,10 @@
+import re
+import requests
+import urllib3
+
+# disable insecure request warnings, once at import for all API classes
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+requests.packages.urllib3.disable_warnings( )
+
+# shared by all API classes, see the UUID_PATTERN class attributes
+_UUID_PATTERN = re.compile(r"^[\da-f]{8}-([\da-f]{4}-){3}[\da-f]{12}$", re.IGNORECASE)
@@ -1,14 +1,10 @@
-import os
-import re
-import requests
-import urllib3
 from pathlib import Path
-from requests import Session
-from requests.auth import HTTPBasicAuth
-from zeep import Client, Settings
-from zeep.cache import SqliteCache
 from zeep.exceptions import Fault
-from zeep.transports import Transport
+from ._client import _get_connection
+from ._common import _UUID_PATTERN
+
+# the WSDL files are shipped with the package, resolved once at import
+_WSDL_ROOT = Path(__file__).resolve().parent / "schema"
 
 
 class axl(object):
@@ -18,47 +14,32 @@ class axl(object):
     Tested with Python 3.8.10.
     """
 
-    def __init__(self, username, password, cucm, cucm_version):
+    UUID_PATTERN = _UUID_PATTERN
+
+    def __init__(self, username, password, cucm, cucm_version, connection=None):
         """
         :param username: axl username
         :param password: axl password
         :param cucm: fqdn or IP address of CUCM
         :param cucm_version: CUCM version
+        :param connection: optional CucmConnection to share with other API classes.
+                           Defaults to the connection shared by all classes using the same CUCM and credentials
         """
 
-        cwd = os.path.dirname(os.path.abspath(__file__))
-        if os.name == "posix":
-            wsdl = Path(f"{cwd}/schema/{cucm_version}/AXLAPI.wsdl").as_uri()
-        else:
-            wsdl = str(Path(f"{cwd}/schema/{cucm_version}/AXLAPI.wsdl").absolute())
-
-        # create a session
-        session = Session()
-        
-        # disable certificate verification and insecure request warnings
-        session.verify = False
-        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-        requests.packages.urllib3.disable_warnings( )
+        wsdl = (_WSDL_ROOT / cucm_version / "AXLAPI.wsdl").as_uri()
 
-        # to enable SSL cert verification, copy the CUCM tomcat .pem file and uncomment the following lines
-        # CERT = 'cucmtomcat.pem'
-        # session.verify = CERT
-
-        session.auth = HTTPBasicAuth(username, password)
-        transport = Transport(session=session, timeout=10, cache=SqliteCache())
-
-        settings = Settings(strict=False, xml_huge_tree=True, xsd_ignore_sequence_order=True)
-        
-        axl_client = Client(wsdl, settings=settings, transport=transport)
+        # the session and the parsed client are shared between instances, see CucmConnection
+        # the AXL schema is large, it is only parsed once per process
+        if connection is None:
+            connection = _get_connection(username, password, cucm, cucm_version)
+        axl_client = connection.client(wsdl)
 
         self.wsdl = wsdl
         self.username = username
         self.password = password
         self.cucm = cucm
         self.cucm_version = cucm_version
-        self.UUID_PATTERN = re.compile(
-            r"^[\da-f]{8}-([\da-f]{4}-){3}[\da-f]{12}$", re.IGNORECASE
-        )
+        self.connection = connection
         self.client = axl_client.create_service(
             "{http://www.cisco.com/AXLAPIService/}AXLAPIBinding",
             f"https://{cucm}:8443/axl/",
@@ -1,13 +1,72 @@
-import re
-import requests
-import urllib3
+import socket
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from requests import Session
-from requests.auth import HTTPBasicAuth
-from zeep import Client, Settings
-from zeep.cache import SqliteCache
+from string import Template
+from xml.sax.saxutils import escape
 from zeep.exceptions import Fault
-from zeep.transports import Transport
+from ._client import _get_connection, _typed_record, _xsd_fields, Record
+from ._common import _UUID_PATTERN
+
+# templates of the request bodies, copied and filled in by the methods
+_CONTROL_EX_TMPL = {"ProductId": None, "DependencyType": None, "ControlType": None, "ServiceList": None}
+_DEPLOY_TMPL = {"NodeName": None, "DeployType": None, "ServiceList": None}
+
+# prebuilt SOAP envelopes of the hot methods, posted without zeep, see CucmConnection.post_soap()
+_ENVELOPE_TMPL = Template(
+    '<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns:soap="http://schemas.cisco.com/ast/soap">'
+    '<soapenv:Body>$body</soapenv:Body></soapenv:Envelope>'
+)
+_CONTROL_ENVELOPE = Template(_ENVELOPE_TMPL.substitute(body=
+    '<soap:soapDoControlServices><soap:ControlServiceRequest>'
+    '<soap:NodeName>$node</soap:NodeName><soap:ControlType>$action</soap:ControlType><soap:ServiceList>$services</soap:ServiceList>'
+    '</soap:ControlServiceRequest></soap:soapDoControlServices>'
+))
+_STATUS_ENVELOPE = Template(_ENVELOPE_TMPL.substitute(body=
+    '<soap:soapGetServiceStatus><soap:ServiceStatus>$services</soap:ServiceStatus></soap:soapGetServiceStatus>'
+))
+_DIRECTORY_LIST_ENVELOPE = Template(_ENVELOPE_TMPL.substitute(body=
+    '<soap:getFileDirectoryList><soap:DirectoryPath>$path</soap:DirectoryPath></soap:getFileDirectoryList>'
+))
+
+def _service_list(services):
+    """
+    Return the <item> elements of an ArrayOfServiceName for a list of service names.
+    """
+    if isinstance(services, str):
+        services = [services] if services else []
+    return "".join(f"<soap:item>{escape(service)}</soap:item>" for service in services)
+
+
+def _result(response, fields):
+    """
+    Parse a response element and unwrap it like zeep does: a response with a single part returns that part,
+    and a part with a single child element (e.g. an array of items) returns that child.
+    """
+    record = _typed_record(response, fields)
+    if len(record) != 1:
+        return record
+    value = next(iter(record.values()))
+    if isinstance(value, Record) and len(value) == 1:
+        return next(iter(value.values()))
+    return value
+
+
+def _addresses(host):
+    # not cached, the addresses of a node may change in a long-running process
+    return frozenset(info[4][0] for info in socket.getaddrinfo(host, None))
+
+
+def _same_host(a, b):
+    """
+    Tell whether two host names or IP addresses refer to the same node, e.g. 'cucm-pub' and '10.0.0.1'.
+    """
+    if a.lower() == b.lower():
+        return True
+    try:
+        return not _addresses(a).isdisjoint(_addresses(b))
+    except OSError:
+        return False
 
 
 class ccs(object):
@@ -18,44 +77,105 @@ class ccs(object):
     Tested with Python 3.8.10 and 3.9.5
     """
 
-    def __init__(self, username, password, cucm, cucm_version):
+    UUID_PATTERN = _UUID_PATTERN
+
+    # urls and bindings, the urls are formatted once per instance
+    _WSDL_FMT = "https://{cucm}:8443/controlcenterservice2/services/ControlCenterServices?wsdl"
+    _WSDL_EX_FMT = "https://{cucm}:8443/controlcenterservice2/services/ControlCenterServicesEx?wsdl"
+    _ADDRESS_FMT = "https://{cucm}:8443/controlcenterservice2/services/ControlCenterServices"
+    _ADDRESS_EX_FMT = "https://{cucm}:8443/controlcenterservice2/services/ControlCenterServicesEx"
+    _BINDING = "{http://schemas.cisco.com/ast/soap}ControlCenterServicesBinding"
+    _BINDING_EX = "{http://schemas.cisco.com/ast/soap}ControlCenterServicesExBinding"
+
+    def __init__(self, username, password, cucm, cucm_version, connection=None):
         """
         :param username: axl username
         :param password: axl password
         :param cucm: fqdn or IP address of CUCM
         :param cucm_version: CUCM version
+        :param connection: optional CucmConnection to share with other API classes.
+                           Defaults to the connection shared by all classes using the same CUCM and credentials
         """
 
-        wsdl = f"https://{cucm}:8443/controlcenterservice2/services/ControlCenterServices?wsdl"
-        wsdl_ex = f"https://{cucm}:8443/controlcenterservice2/services/ControlCenterServicesEx?wsdl"
-        
-        # create a session
-        session = Session()
-
-        # disable certificate verification and insecure request warnings
-        session.verify = False
-        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-        requests.packages.urllib3.disable_warnings( )
-
-        # to enable SSL cert verification, copy the CUCM tomcat .pem file and uncomment the following lines
-        # CERT = 'cucmtomcat.pem'
-        # session.verify = CERT
-
-        session.auth = HTTPBasicAuth(username, password)
-        transport = Transport(session=session, timeout=10, cache=SqliteCache())
-        settings = Settings(strict=False, xml_huge_tree=True, xsd_ignore_sequence_order=True)
-        ccs_client = Client(wsdl, settings=settings, transport=transport)
-        css_client_ex = Client(wsdl_ex, settings=settings, transport=transport)
-
-        self.wsdl = wsdl
-        self.wsdl_ex = wsdl_ex
+        wsdl = sys.intern(self._WSDL_FMT.format(cucm=cucm))
+        address = sys.intern(self._ADDRESS_FMT.format(cucm=cucm))
+
+        # the session and the parsed clients are shared between instances, see CucmConnection
+        if connection is None:
+            connection = _get_connection(username, password, cucm, cucm_version)
+        # the WSDL of the extended API is only parsed when it is used, see client_ex
+        ccs_client = connection.client(wsdl, self._BINDING)
+
+        self.wsdl = ccs_client.wsdl.location
         self.username = username
         self.password = password
         self.cucm = cucm
         self.cucm_version = cucm_version
-        self.UUID_PATTERN = re.compile(r"^[\da-f]{8}-([\da-f]{4}-){3}[\da-f]{12}$", re.IGNORECASE)
-        self.client = ccs_client.create_service("{http://schemas.cisco.com/ast/soap}ControlCenterServicesBinding", f"https://{cucm}:8443/controlcenterservice2/services/ControlCenterServices")
-        self.client_ex = css_client_ex.create_service("{http://schemas.cisco.com/ast/soap}ControlCenterServicesExBinding", f"https://{cucm}:8443/controlcenterservice2/services/ControlCenterServicesEx")
+        self.connection = connection
+        self.client = ccs_client.create_service(self._BINDING, address)
+        # the hot methods post their envelopes directly, with the SOAPAction defined in the WSDL
+        binding = ccs_client.wsdl.bindings[self._BINDING]
+        self._address = address
+        self._soap_actions = {name: binding.get(name).soapaction for name in ("soapDoControlServices", "soapGetServiceStatus")}
+        # the responses are parsed without zeep, converting the values with the types defined in the WSDL
+        # both return a ServiceInformationResponse, the services are in its ServiceInfoList
+        (self._response_fields, _), = _xsd_fields(binding.get("soapDoControlServices").output.body.type).values()
+        self._service_fields = self._response_fields["ServiceInfoList"][0]["item"][0]
+        self._wsdl_url = wsdl
+        self._wsdl_ex_url = sys.intern(self._WSDL_EX_FMT.format(cucm=cucm))
+        self._address_ex = sys.intern(self._ADDRESS_EX_FMT.format(cucm=cucm))
+        self._client_ex = None
+        self._client_async = None
+        self._client_ex_async = None
+        self._directory_list = None
+        # ccs instances of the other nodes, see soapDoControlServices_cluster()
+        self._nodes = {}
+
+    @property
+    def wsdl_ex(self):
+        """
+        Location of the WSDL of the 'Control Center Services Extended' API.
+        """
+        return self.connection.client(self._wsdl_ex_url, self._BINDING_EX).wsdl.location
+
+    @property
+    def client_ex(self):
+        """
+        zeep service for the 'Control Center Services Extended' API, created on first use.
+        Callers that only use the base API never pay for parsing the extended WSDL.
+        """
+        if self._client_ex is None:
+            css_client_ex = self.connection.client(self._wsdl_ex_url, self._BINDING_EX)
+            self._client_ex = css_client_ex.create_service(self._BINDING_EX, self._address_ex)
+        return self._client_ex
+
+    @property
+    def client_async(self):
+        """
+        zeep service for the asyncio methods, created on first use. Requires the optional httpx package.
+        """
+        if self._client_async is None:
+            self._client_async = self.connection.async_service(self._wsdl_url, self._BINDING, self._address)
+        return self._client_async
+
+    @property
+    def client_ex_async(self):
+        """
+        zeep service for the asyncio methods of the extended API, created on first use. Requires the optional httpx package.
+        """
+        if self._client_ex_async is None:
+            self._client_ex_async = self.connection.async_service(self._wsdl_ex_url, self._BINDING_EX, self._address_ex)
+        return self._client_ex_async
+
+    def _directory_list_operation(self):
+        """
+        Return the SOAPAction and the output fields of getFileDirectoryList, read from the extended WSDL on first use.
+        """
+        if self._directory_list is None:
+            binding = self.connection.client(self._wsdl_ex_url, self._BINDING_EX).wsdl.bindings[self._BINDING_EX]
+            operation = binding.get("getFileDirectoryList")
+            self._directory_list = (operation.soapaction, _xsd_fields(operation.output.body.type))
+        return self._directory_list
 
     def getProductInformationList(self, ServiceInfo=""):
         """
@@ -83,19 +203,83 @@ class ccs(object):
         :param services: list with names of the services to start, stop, or restart. Mustn't be empty.
         :return: result dict
         """
-        ControlServiceRequest = {
-            "NodeName": node,
-            "ControlType": action,
-            "ServiceList": {
-                "item": services
-            }
-        }
+        envelope = _CONTROL_ENVELOPE.substitute(node=escape(node), action=escape(action), services=_service_list(services))
 
         try:
-            return self.client.soapDoControlServices(ControlServiceRequest)
+            response = self.connection.post_soap(self._address, envelope, self._soap_actions["soapDoControlServices"])
         except Fault as e:
             return e
+        return _typed_record(response[0], self._response_fields)
     
+    def soapDoControlServices_cluster(self, nodes, action, services, max_workers=8):
+        """
+        Method to start or stop a list of services on several nodes at once.
+        The calls are sent concurrently, so the total time is close to that of the slowest node
+        instead of the sum of all of them.
+
+        Control Center Services can only control the services of the node it is called on,
+        so every other node is called through its own ccs instance and connection, with the credentials
+        and connection options (e.g. http2) of this one. The first call for a node downloads and parses
+        its WSDL, the instances are kept for the next calls.
+        A node that can't be reached doesn't stop the others, the exception is returned as its result.
+
+        :param nodes: list with the names of the nodes, e.g. the names returned by AXL listProcessNode()
+        :param action: action to perform. Can be 'Start', 'Stop', or 'Restart'
+        :param services: list with names of the services to start, stop, or restart. Mustn't be empty.
+        :param max_workers: maximum number of concurrent calls
+        :return: dict with the result dict (or the exception) of each node, keyed by node name
+        """
+        results = {}
+        # the instances are created here, before the calls are sent, so the threads don't share self._nodes
+        clients = {}
+        for node in nodes:
+            if node in clients or node in results:
+                continue
+            try:
+                clients[node] = self._node_client(node)
+            except Exception as e:
+                results[node] = e
+
+        def control(node):
+            try:
+                return clients[node].soapDoControlServices(node, action, services)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results.update(zip(clients, executor.map(control, clients)))
+        return {node: results[node] for node in nodes}
+
+    def _node_client(self, node):
+        """
+        Return the ccs instance that controls the services of a node, see soapDoControlServices_cluster().
+        """
+        if node in self._nodes:
+            return self._nodes[node]
+        if _same_host(node, self.cucm):
+            return self
+        connection = self.connection.for_node(node)
+        self._nodes[node] = ccs(self.username, self.password, node, self.cucm_version, connection=connection)
+        return self._nodes[node]
+
+    async def soapDoControlServices_async(self, node, action, services):
+        """
+        asyncio variant of soapDoControlServices(). Requires the optional httpx package.
+        Use asyncio.gather() to control the services of several nodes concurrently.
+
+        :param node: name of the local node
+        :param action: action to perform. Can be 'Start', 'Stop', or 'Restart'
+        :param services: list with names of the services to start, stop, or restart. Mustn't be empty.
+        :return: result dict, see soapDoControlServices()
+        """
+        envelope = _CONTROL_ENVELOPE.substitute(node=escape(node), action=escape(action), services=_service_list(services))
+
+        try:
+            response = await self.connection.post_soap_async(self._address, envelope, self._soap_actions["soapDoControlServices"])
+        except Fault as e:
+            return e
+        return _typed_record(response[0], self._response_fields)
+
     def soapDoServiceDeployment(self, node, action, services):
         """
         Method to deploy or undeploy (activate/deactivate) a deployable service, where a deployable service 
@@ -109,13 +293,10 @@ class ccs(object):
         :param services: list with names of the services to deploy or undeploy. Mustn't be empty.
         :return: result dict
         """
-        DeploymentServiceRequest = {
-            "NodeName": node,
-            "DeployType": action,
-            "ServiceList": {
-                "item": services
-            }
-        }
+        DeploymentServiceRequest = _DEPLOY_TMPL.copy()
+        DeploymentServiceRequest["NodeName"] = node
+        DeploymentServiceRequest["DeployType"] = action
+        DeploymentServiceRequest["ServiceList"] = {"item": services}
 
         try:
             return self.client.soapDoServiceDeployment(DeploymentServiceRequest)
@@ -131,11 +312,48 @@ class ccs(object):
         :param ServiceStatus: leave blank to get all services or provide list with service names
         :return: result list
         """
+        envelope = _STATUS_ENVELOPE.substitute(services=_service_list(ServiceStatus))
+
+        # the response holds a record for every service, stream them out instead of parsing the whole document
+        items = self.connection.iter_soap(self._address, envelope, self._soap_actions["soapGetServiceStatus"], "{*}item")
         try:
-            return self.client.soapGetServiceStatus(ServiceStatus)["ServiceInfoList"]["item"]
+            return [_typed_record(item, self._service_fields) for item in items]
         except Fault as e:
             return e
 
+    def soapGetServiceStatus_soa(self, ServiceStatus=""):
+        """
+        Variant of soapGetServiceStatus() that returns the services column by column, i.e. one list per field
+        instead of one record per service. Filtering on a field is then a scan of a single list,
+        e.g. stopped = [name for name, status in zip(result["ServiceName"], result["ServiceStatus"]) if status == "Stopped"]
+        The result can be passed to pandas.DataFrame() as is.
+
+        :param ServiceStatus: leave blank to get all services or provide list with service names
+        :return: result dict with a list per field, e.g. {"ServiceName": [...], "ServiceStatus": [...], ...}
+                 The lists are empty if no service was found
+        """
+        rows = self.soapGetServiceStatus(ServiceStatus)
+        if isinstance(rows, Fault):
+            return rows
+        # the columns are the fields of the schema, every record has all of them (None if missing)
+        return {key: [row[key] for row in rows] for key in self._service_fields}
+
+    async def soapGetServiceStatus_async(self, ServiceStatus=""):
+        """
+        asyncio variant of soapGetServiceStatus(). Requires the optional httpx package.
+        Use asyncio.gather() to query several nodes concurrently.
+
+        :param ServiceStatus: leave blank to get all services or provide list with service names
+        :return: result list, see soapGetServiceStatus()
+        """
+        envelope = _STATUS_ENVELOPE.substitute(services=_service_list(ServiceStatus))
+
+        try:
+            response = await self.connection.post_soap_async(self._address, envelope, self._soap_actions["soapGetServiceStatus"])
+        except Fault as e:
+            return e
+        return [_typed_record(item, self._service_fields) for item in response.iter("{*}item")]
+
     def soapGetStaticServiceList(self, ServiceInformationResponse=""):
         """
         Perform a query of all static specifications for services in CUCM.
@@ -158,10 +376,31 @@ class ccs(object):
         :param path: directory path of the files. e.g. '/var/log/active/tomcat/logs/ccmservice'
         :return: result list
         """
+        envelope = _DIRECTORY_LIST_ENVELOPE.substitute(path=escape(path))
+        soap_action, fields = self._directory_list_operation()
+
+        try:
+            response = self.connection.post_soap(self._address_ex, envelope, soap_action)
+        except Fault as e:
+            return e
+        return _result(response, fields)
+
+    async def getFileDirectoryList_async(self, path):
+        """
+        asyncio variant of getFileDirectoryList(). Requires the optional httpx package.
+        Use asyncio.gather() to list several directories concurrently.
+
+        :param path: directory path of the files. e.g. '/var/log/active/tomcat/logs/ccmservice'
+        :return: result list, see getFileDirectoryList()
+        """
+        envelope = _DIRECTORY_LIST_ENVELOPE.substitute(path=escape(path))
+        soap_action, fields = self._directory_list_operation()
+
         try:
-            return self.client_ex.getFileDirectoryList(DirectoryPath=path)
+            response = await self.connection.post_soap_async(self._address_ex, envelope, soap_action)
         except Fault as e:
             return e
+        return _result(response, fields)
 
     def getStaticServiceListExtended(self, ServiceInformationResponse=""):
         """
@@ -193,14 +432,11 @@ class ccs(object):
         :param services: list with names of the services to start, stop, or restart. Mustn't be empty.
         :return: result dict
         """
-        ControlServiceRequestEx = {
-            "ProductId": pid,
-            "DependencyType": dependencies,
-            "ControlType": action,
-            "ServiceList": {
-                "item": services
-            }
-        }
+        ControlServiceRequestEx = _CONTROL_EX_TMPL.copy()
+        ControlServiceRequestEx["ProductId"] = pid
+        ControlServiceRequestEx["DependencyType"] = dependencies
+        ControlServiceRequestEx["ControlType"] = action
+        ControlServiceRequestEx["ServiceList"] = {"item": services}
 
         try:
             return self.client_ex.soapDoControlServicesEx(ControlServiceRequestEx)
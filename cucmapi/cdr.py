@@ -1,13 +1,26 @@
-import re
-import requests
-import urllib3
+import sys
 from pathlib import Path
-from requests import Session
-from requests.auth import HTTPBasicAuth
-from zeep import Client, Settings
-from zeep.cache import SqliteCache
+from string import Template
+from xml.sax.saxutils import escape
 from zeep.exceptions import Fault
-from zeep.transports import Transport
+from ._client import _get_connection
+from ._common import _UUID_PATTERN
+
+# prebuilt SOAP envelope of get_file_list (rpc/encoded), posted without zeep, see CucmConnection.post_soap()
+_FILE_LIST_ENVELOPE = Template(
+    '<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+    'xmlns:xsd="http://www.w3.org/2001/XMLSchema" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:ns="$ns">'
+    '<soapenv:Body><ns:get_file_list soapenv:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">'
+    '<in0 xsi:type="xsd:string">$start_time</in0><in1 xsi:type="xsd:string">$end_time</in1><in2 xsi:type="xsd:boolean">$all_files</in2>'
+    '</ns:get_file_list></soapenv:Body></soapenv:Envelope>'
+)
+
+
+def _file_names(response):
+    """
+    Return the file names of a get_file_list response, <get_file_listReturn> holds one element per file name.
+    """
+    return [item.text for item in response[0]] if len(response) else []
 
 
 class cdr(object):
@@ -25,40 +38,54 @@ class cdr(object):
     the CDR Repository Manager to directly FTP or SSH-FTP the files to your server
     """
 
-    def __init__(self, username, password, cucm, cucm_version):
+    UUID_PATTERN = _UUID_PATTERN
+
+    # url and binding, the urls are formatted once per instance
+    _WSDL_FMT = "https://{cucm}:8443/CDRonDemandService2/services/CDRonDemandService?wsdl"
+    _ADDRESS_FMT = "https://{cucm}:8443/CDRonDemandService2/services/CDRonDemandService"
+    _BINDING = "{http://schemas.cisco.com/ast/soap}CDRonDemandSoapBinding"
+
+    def __init__(self, username, password, cucm, cucm_version, connection=None):
         """
         :param username: axl username
         :param password: axl password
         :param cucm: fqdn or IP address of CUCM
         :param cucm_version: CUCM version
+        :param connection: optional CucmConnection to share with other API classes.
+                           Defaults to the connection shared by all classes using the same CUCM and credentials
         """
 
-        wsdl = f"https://{cucm}:8443/CDRonDemandService2/services/CDRonDemandService?wsdl"
-        
-        # create a session
-        session = Session()
-
-        # disable certificate verification and insecure request warnings
-        session.verify = False
-        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-        requests.packages.urllib3.disable_warnings( )
+        wsdl = sys.intern(self._WSDL_FMT.format(cucm=cucm))
+        address = sys.intern(self._ADDRESS_FMT.format(cucm=cucm))
 
-        # to enable SSL cert verification, copy the CUCM tomcat .pem file and uncomment the following lines
-        # CERT = 'cucmtomcat.pem'
-        # session.verify = CERT
+        # the session and the parsed client are shared between instances, see CucmConnection
+        if connection is None:
+            connection = _get_connection(username, password, cucm, cucm_version)
+        cdr_client = connection.client(wsdl, self._BINDING)
 
-        session.auth = HTTPBasicAuth(username, password)
-        transport = Transport(session=session, timeout=10, cache=SqliteCache())
-        settings = Settings(strict=False, xml_huge_tree=True, xsd_ignore_sequence_order=True) 
-        cdr_client = Client(wsdl, settings=settings, transport=transport) 
-
-        self.wsdl = wsdl
+        self.wsdl = cdr_client.wsdl.location
         self.username = username
         self.password = password
         self.cucm = cucm
         self.cucm_version = cucm_version
-        self.UUID_PATTERN = re.compile(r"^[\da-f]{8}-([\da-f]{4}-){3}[\da-f]{12}$", re.IGNORECASE)
-        self.client = cdr_client.create_service("{http://schemas.cisco.com/ast/soap}CDRonDemandSoapBinding", f"https://{cucm}:8443/CDRonDemandService2/services/CDRonDemandService")
+        self.connection = connection
+        self.client = cdr_client.create_service(self._BINDING, address)
+        self._wsdl_url = wsdl
+        self._client_async = None
+        # get_file_list posts its envelope directly, with the namespace and SOAPAction defined in the WSDL
+        operation = cdr_client.wsdl.bindings[self._BINDING].get("get_file_list")
+        self._address = address
+        self._file_list_ns = operation.input.body.qname.namespace
+        self._file_list_action = operation.soapaction
+
+    @property
+    def client_async(self):
+        """
+        zeep service for the asyncio methods, created on first use. Requires the optional httpx package.
+        """
+        if self._client_async is None:
+            self._client_async = self.connection.async_service(self._wsdl_url, self._BINDING, self._address)
+        return self._client_async
 
     def get_file(self, sftp_ip, sftp_user, sftp_pass, sftp_directory, file_name, sftp="true"):
         """
@@ -99,7 +126,37 @@ class cdr(object):
         :return: result list
         """
 
+        envelope = self._file_list_envelope(start_time, end_time, all_files)
+
         try:
-            return self.client.get_file_list(in0=start_time, in1=end_time, in2=all_files)
+            response = self.connection.post_soap(self._address, envelope, self._file_list_action)
         except Fault as e:
             return e
+        return _file_names(response)
+
+    async def get_file_list_async(self, start_time, end_time, all_files="true"):
+        """
+        asyncio variant of get_file_list(). Requires the optional httpx package.
+        Use asyncio.gather() to query several one hour intervals concurrently.
+
+        :param start_time: Starting time in UTC for the search interval. 
+                           The format is a string: YYYYMMDDHHMM
+        :param end_time:   Ending time in UTC for the search interval. 
+                           The format is a string: YYYYMMDDHHMM
+        :param all_files:  Boolean to tell service whether to include files that 
+                           were successfully sent to the specified server.
+        :return: result list, see get_file_list()
+        """
+
+        envelope = self._file_list_envelope(start_time, end_time, all_files)
+
+        try:
+            response = await self.connection.post_soap_async(self._address, envelope, self._file_list_action)
+        except Fault as e:
+            return e
+        return _file_names(response)
+
+    def _file_list_envelope(self, start_time, end_time, all_files):
+        return _FILE_LIST_ENVELOPE.substitute(
+            ns=self._file_list_ns, start_time=escape(start_time), end_time=escape(end_time), all_files=escape(str(all_files).lower())
+        )
@@ -1,67 +1,178 @@
-import os
-from zeep import Client
+import re
+import sys
+from collections import namedtuple
+from functools import lru_cache
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from lxml import etree
 from pathlib import Path
 
 
 CUCM_VERSION = "11.5"
 
-def load_wsdl_file(cucm_version):
-    cwd = os.path.dirname(os.path.abspath(__file__))
-    if os.name == "posix":
-        wsdl = Path(f"{cwd}/schema/{cucm_version}/AXLAPI.wsdl").as_uri()
-    else:
-        wsdl = str(Path(f"{cwd}/schema/{cucm_version}/AXLAPI.wsdl").absolute())
-    return Client(wsdl)
+# the WSDL files and templates are kept next to this script, resolved once at import
+_HERE = Path(__file__).resolve().parent
+_WSDL_ROOT = _HERE / "schema"
+_TEMPLATE_DIR = _HERE / "templates"
+
+# operation names are camelCase, the first capital letter starts the element group name
+_FIRST_UPPER = re.compile(r'[A-Z]').search
+
+XSD_NS = "http://www.w3.org/2001/XMLSchema"
+WSDL_NS = "http://schemas.xmlsoap.org/wsdl/"
+_XSD = f"{{{XSD_NS}}}"
+_WSDL = f"{{{WSDL_NS}}}"
+_INDICATORS = frozenset({_XSD + "sequence", _XSD + "choice", _XSD + "all"})
+
+# the type names match the str() of the zeep types the generator used to introspect, e.g. 'String128(value)'
+# xsd:anyType and xsd:any are marked with ANY_TYPE
+ANY_TYPE = "AnyType"
+# builtins whose zeep class name keeps the lowercase first letter
+_LOWERCASE_BUILTINS = frozenset({
+    "anySimpleType", "anyURI", "base64Binary", "gDay", "gMonth", "gMonthDay", "gYear", "gYearMonth"
+})
+
+
+# one parsed element, a tuple is lighter than a dict per node and pickles cheaply to the render workers
+Elem = namedtuple('Elem', ['optional', 'type'])
+
+
+def _qname(node, value):
+    # resolve a prefixed attribute value like 'axlapi:XFkType' to '{namespace}XFkType'
+    prefix, _, local = value.rpartition(":")
+    return etree.QName(node.nsmap.get(prefix or None), local).text
 
 
-def create_client(cucm_version):
-    client = load_wsdl_file(cucm_version)
-    return client
+class XsdSchema(object):
+    # walks the WSDL and its imported XSD with lxml
+    # only the input elements of the operations are needed to generate the methods,
+    # building zeep's bindings, transports and type objects for that is a lot slower
 
+    def __init__(self, wsdl_path):
+        self.wsdl = etree.parse(str(wsdl_path)).getroot()
+        self.elements = {}
+        self.types = {}
+        # named complex types are referenced many times, resolve each of them only once
+        self._resolved = {}
+        for imp in self.wsdl.iterfind(_WSDL + "import"):
+            self._load(wsdl_path.parent / imp.get("location"))
 
-def parse_elements(elements):
-# source: https://stackoverflow.com/questions/50089400/introspecting-a-wsdl-with-python-zeep
-    all_elements = {}
-    for name, element in elements:
-        all_elements[name] = {}
-        all_elements[name]['optional'] = element.is_optional
-        if hasattr(element.type, 'elements'):
-            all_elements[name]['type'] = parse_elements(
-                element.type.elements)
-        else:
-            all_elements[name]['type'] = str(element.type)
-    return all_elements
+    def _load(self, path):
+        schema = etree.parse(str(path)).getroot()
+        tns = schema.get("targetNamespace")
+        for node in schema:
+            if node.tag == _XSD + "element":
+                self.elements[etree.QName(tns, node.get("name")).text] = node
+            elif node.tag in (_XSD + "complexType", _XSD + "simpleType"):
+                self.types[etree.QName(tns, node.get("name")).text] = node
 
+    def type_name(self, node, value):
+        qname = etree.QName(_qname(node, value))
+        if qname.namespace == XSD_NS:
+            local = qname.localname
+            if local == "anyType":
+                return ANY_TYPE
+            if local not in _LOWERCASE_BUILTINS:
+                local = local[0].upper() + local[1:]
+            return sys.intern(f"{local}(value)")
+        if qname.text not in self._resolved:
+            self._resolved[qname.text] = self.resolve(self.types[qname.text], qname.localname)
+        return self._resolved[qname.text]
 
-def parse_service_interfaces(client):
-# source: https://stackoverflow.com/questions/50089400/introspecting-a-wsdl-with-python-zeep
+    def resolve(self, node, name):
+        # complex types become a dict of their elements, simple types a type name
+        if node.tag == _XSD + "complexType":
+            return {elem_name: Elem(optional, entry_type) for elem_name, optional, entry_type in self.items(node)}
+        child = next(c for c in node if c.tag != _XSD + "annotation")
+        if child.tag == _XSD + "union":
+            return sys.intern("UnionType(value)")
+        if child.tag == _XSD + "list":
+            return sys.intern("ListType(value)")
+        # restrictions are named after the type, or after the element for anonymous types
+        return sys.intern(f"{name}(value)")
+
+    def element_type(self, node):
+        if node.get("type"):
+            return self.type_name(node, node.get("type"))
+        for child in node:
+            if child.tag in (_XSD + "complexType", _XSD + "simpleType"):
+                return self.resolve(child, node.get("name"))
+        return ANY_TYPE
+
+    def items(self, node):
+        # (name, optional, type) of the elements of a complex type, extensions list the base elements first
+        items = []
+        for child in node:
+            if child.tag in _INDICATORS:
+                items.extend(self.indicator_items(child))
+            elif child.tag == _XSD + "complexContent":
+                for ext in child.iterfind(_XSD + "extension"):
+                    items.extend(self.items(self.types[_qname(ext, ext.get("base"))]))
+                    items.extend(self.items(ext))
+            elif child.tag == _XSD + "simpleContent":
+                for ext in child.iterfind(_XSD + "extension"):
+                    base = self.types.get(_qname(ext, ext.get("base")))
+                    if base is not None and base.tag == _XSD + "complexType":
+                        items.extend(self.items(base))
+                    else:
+                        # the value of a simple content type
+                        items.append(("_value_1", False, self.type_name(ext, ext.get("base"))))
+        return items
+
+    def indicator_items(self, node):
+        # nested sequences and choices are flattened, the direct children of a choice are optional
+        in_choice = node.tag == _XSD + "choice"
+        items = []
+        any_count = 0
+        for child in node:
+            if child.tag == _XSD + "element":
+                items.append((child.get("name"), in_choice or child.get("minOccurs") == "0", self.element_type(child)))
+            elif child.tag in _INDICATORS:
+                items.extend(self.indicator_items(child))
+            elif child.tag == _XSD + "any":
+                any_count += 1
+                items.append((f"_value_{any_count}", child.get("minOccurs") == "0", ANY_TYPE))
+        return items
+
+
+# parsing the AXL WSDL is by far the slowest part of the script, parse every version only once per run
+@lru_cache(maxsize=None)
+def load_wsdl_file(cucm_version):
+    return XsdSchema(_WSDL_ROOT / cucm_version / "AXLAPI.wsdl")
+
+
+def parse_service_interfaces(schema):
+    # {service: {port: {'operations': {operation: {'input': {element: Elem}}}}}}, in the order of the binding
+    wsdl = schema.wsdl
+    tns = wsdl.get("targetNamespace")
+    messages = {etree.QName(tns, m.get("name")).text: m for m in wsdl.iterfind(_WSDL + "message")}
+    port_types = {etree.QName(tns, p.get("name")).text: p for p in wsdl.iterfind(_WSDL + "portType")}
+    bindings = {etree.QName(tns, b.get("name")).text: b for b in wsdl.iterfind(_WSDL + "binding")}
     interface = {}
-    for service in client.wsdl.services.values():
-        interface[service.name] = {}
-        for port in service.ports.values():
-            interface[service.name][port.name] = {}
+    for service in wsdl.iterfind(_WSDL + "service"):
+        interface[service.get("name")] = {}
+        for port in service.iterfind(_WSDL + "port"):
+            binding = bindings[_qname(port, port.get("binding"))]
+            port_type = port_types[_qname(binding, binding.get("type"))]
+            inputs = {op.get("name"): op.find(_WSDL + "input") for op in port_type.iterfind(_WSDL + "operation")}
             operations = {}
-            for operation in port.binding._operations.values():
-                operations[operation.name] = {}
-                operations[operation.name]['input'] = {}
-                elements = operation.input.body.type.elements
-                operations[operation.name]['input'] = parse_elements(elements)
-            interface[service.name][port.name]['operations'] = operations
+            for operation in binding.iterfind(_WSDL + "operation"):
+                name = operation.get("name")
+                message = messages[_qname(inputs[name], inputs[name].get("message"))]
+                part = message.find(_WSDL + "part")
+                element = schema.elements[_qname(part, part.get("element"))]
+                operations[name] = {'input': schema.element_type(element)}
+            interface[service.get("name")][port.get("name")] = {'operations': operations}
     return interface
 
 
 def write_imports():
-    text = '''import os
-import re
-import requests
-import urllib3
-from pathlib import Path
-from requests import Session
-from requests.auth import HTTPBasicAuth
-from zeep import Client, Settings
-from zeep.cache import SqliteCache
+    text = '''from pathlib import Path
 from zeep.exceptions import Fault
-from zeep.transports import Transport
+from ._client import _get_connection
+from ._common import _UUID_PATTERN
+
+# the WSDL files are shipped with the package, resolved once at import
+_WSDL_ROOT = Path(__file__).resolve().parent / "schema"
 '''
     return text
 
@@ -75,47 +186,32 @@ class axl(object):
     Tested with Python 3.8.10.
     """
 
-    def __init__(self, username, password, cucm, cucm_version):
+    UUID_PATTERN = _UUID_PATTERN
+
+    def __init__(self, username, password, cucm, cucm_version, connection=None):
         """
         :param username: axl username
         :param password: axl password
         :param cucm: fqdn or IP address of CUCM
         :param cucm_version: CUCM version
+        :param connection: optional CucmConnection to share with other API classes.
+                           Defaults to the connection shared by all classes using the same CUCM and credentials
         """
 
-        cwd = os.path.dirname(os.path.abspath(__file__))
-        if os.name == "posix":
-            wsdl = Path(f"{cwd}/schema/{cucm_version}/AXLAPI.wsdl").as_uri()
-        else:
-            wsdl = str(Path(f"{cwd}/schema/{cucm_version}/AXLAPI.wsdl").absolute())
-
-        # create a session
-        session = Session()
-        
-        # disable certificate verification and insecure request warnings
-        session.verify = False
-        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-        requests.packages.urllib3.disable_warnings( )
-
-        # to enable SSL cert verification, copy the CUCM tomcat .pem file and uncomment the following lines
-        # CERT = 'cucmtomcat.pem'
-        # session.verify = CERT
+        wsdl = (_WSDL_ROOT / cucm_version / "AXLAPI.wsdl").as_uri()
 
-        session.auth = HTTPBasicAuth(username, password)
-        transport = Transport(session=session, timeout=10, cache=SqliteCache())
-
-        settings = Settings(strict=False, xml_huge_tree=True, xsd_ignore_sequence_order=True)
-        
-        axl_client = Client(wsdl, settings=settings, transport=transport)
+        # the session and the parsed client are shared between instances, see CucmConnection
+        # the AXL schema is large, it is only parsed once per process
+        if connection is None:
+            connection = _get_connection(username, password, cucm, cucm_version)
+        axl_client = connection.client(wsdl)
 
         self.wsdl = wsdl
         self.username = username
         self.password = password
         self.cucm = cucm
         self.cucm_version = cucm_version
-        self.UUID_PATTERN = re.compile(
-            r"^[\da-f]{8}-([\da-f]{4}-){3}[\da-f]{12}$", re.IGNORECASE
-        )
+        self.connection = connection
         self.client = axl_client.create_service(
             "{http://www.cisco.com/AXLAPIService/}AXLAPIBinding",
             f"https://{cucm}:8443/axl/",
@@ -124,9 +220,10 @@ class axl(object):
     return text
 
 
-types = ['anyType(value)',
-    'zeep.xsd.types.any.AnyType',
-    'Name128(value)', 
+# simple types, documented with their type name
+# complex types are parsed into dicts, which aren't hashable, so test isinstance(..., str) first
+# the names are interned like the parsed type names, a hit compares the pointers only
+TYPES = frozenset(sys.intern(t) for t in {'Name128(value)', 
     'Name50(value)',
     'String(value)', 
     'String10(value)', 
@@ -199,305 +296,265 @@ types = ['anyType(value)',
     'UnionType(value)',
     'pin(value)',
     'XRequestTimeout(value)',
-    'XRetryCount(value)']
+    'XRetryCount(value)'})
 
 
-def main():
-    cwd = os.path.dirname(os.path.abspath(__file__))
-    axl_file = os.path.join(cwd, "axl.py")
-    client = create_client(CUCM_VERSION)
-    interface = parse_service_interfaces(client)
-
-    all_operations = [op for op in interface['AXLAPIService']['AXLPort']['operations'].keys()]
-
-    with open(axl_file, "w") as f:
-        #'write' the import to the file
-        print(write_imports(), file=f)
-        # 'write' class to the file
-        print(write_class(), file=f)
-
-        for i in all_operations:
-            #get element group name - used for unpacking the result object of (most) 'get' and 'list' operations
-            pos = [idx for idx in range(len(i)) if i[idx].isupper()][0] #find position of first capitalized letter
-            element = i[pos:] #extract element group name
-            element = element[0].lower()+element[1:] #turn first letter into lowercase
-            
-            # get parameters for each operation - used for creating the docstrings
-            param = []
-            for k in interface['AXLAPIService']['AXLPort']['operations'][i]['input'].keys():
-                if interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'] in types:
-                    if interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['optional'] ==  True:
-                        param.append(f"        :param {k}: {interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type']}, optional")
-                    else:
-                        param.append(f"        :param {k}: {interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type']}")
-                else:
-                    if interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['optional'] ==  True:
-                        param.append(f"        :param {k}: optional")
-                    else:
-                        param.append(f"        :param {k}: ")
-                    for l in interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'].keys():
-                            if "<zeep.xsd.types.any.AnyType object" in interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][l]['type']:
-                                if interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][l]['optional'] ==  True:
-                                    param.append(f"            {l}: AnyType, optional")
-                                else:
-                                    param.append(f"            {l}: AnyType")
-                            elif interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][l]['type'] in types:
-                                if interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][l]['optional'] ==  True:
-                                    param.append(f"            {l}: {interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][l]['type']}, optional")
-                                else:
-                                    param.append(f"            {l}: {interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][l]['type']}")
-                            else:
-                                if interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][l]['optional'] ==  True:
-                                    param.append(f"            {l}: optional")
-                                else:
-                                    param.append(f"            {l}: ")
-                                for m in interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][l]['type'].keys():
-                                    if "<zeep.xsd.types.any.AnyType object" in interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][l]['type'][m]['type']:
-                                        if interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][l]['type'][m]['optional'] ==  True:
-                                            param.append(f"                {m}: AnyType, optional")
-                                        else:
-                                            param.append(f"                {m}: AnyType")
-                                    elif interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][l]['type'][m]['type'] in types:
-                                        if interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][l]['type'][m]['optional'] ==  True:
-                                            param.append(f"                {m}: {interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][l]['type'][m]['type']}, optional")
-                                        else:
-                                            param.append(f"                {m}: {interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][l]['type'][m]['type']}")
-                                    else:
-                                        for n in interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][l]['type'][m]['type'].keys():
-                                            if "<zeep.xsd.types.any.AnyType object" in interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][l]['type'][m]['type'][n]['type']:
-                                                if interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][l]['type'][m]['type'][n]['optional'] ==  True:
-                                                    param.append(f"                    {n}: AnyType, optional")
-                                                else:
-                                                    param.append(f"                    {n}: AnyType")
-                                            elif interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][l]['type'][m]['type'][n]['type'] in types:
-                                                if interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][l]['type'][m]['type'][n]['optional'] ==  True:
-                                                    param.append(f"                    {n}: {interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][l]['type'][m]['type'][n]['type']}, optional")
-                                                else:
-                                                    param.append(f"                    {n}: {interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][l]['type'][m]['type'][n]['type']}")
-            # get input arguments of operation and create a list of dictionaries
-            arguments = []
-            for k in interface['AXLAPIService']['AXLPort']['operations'][i]['input'].keys():
-                newk = {}
-                if interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'] in types:
-                    newk[k] = ""
-                    arguments.append(newk)
-                else:
-                    newk[k] = {}
-                    for l in interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'].keys():
-                        if "<zeep.xsd.types.any.AnyType object" in interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][l]['type']:
-                            newk[k][l] = ""
-                        elif interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][l]['type'] in types:
-                            newk[k][l] = ""
-                        else:
-                            newk[k][l] = {}
-                            for m in interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][l]['type'].keys():
-                                if "<zeep.xsd.types.any.AnyType object" in interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][l]['type'][m]['type']:
-                                    newk[k][l][m] = ""
-                                elif interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][l]['type'][m]['type'] in types:
-                                    newk[k][l][m] = ""
-                    arguments.append(newk)
-            # customize the arguments for the different operation types (add, get, list, etc.)
-            axl_args = []
-            tags = {}
-            for a in arguments:
-                # extract all available returnedTags and store them separately
-                if "returnedTags" in a:
-                    tags = a
-                # customize 'list' operations
-                if i.startswith("list"):
-                    for k in a.keys():
-                        # use all returnedTags by default
-                        if "returnedTags" in k:
-                            axl_args.append("returnedTags=returnedTags")
-                        # force searchCriteria to '%', thus always returning all values
-                        elif "searchCriteria" in k:
-                            for n in a[k].keys():
-                                a[k][n]="%"
-                            axl_args.append(f'{a[k]}')
-                        elif a[k]=="":
-                            axl_args.append(f'{k}={k}')
-                        else:
-                            axl_args.append(f'{list(a.keys())[0]}={list(a.values())[0]}')
-                # customize 'add' operations
-                elif i.startswith("add"):
-                    for k in a.keys():
-                        if a[k]=="":
-                            axl_args.append(f'{k}={k}')
-                        else:
-                            for n in list(a.values())[0]:
-                                # fix issue in Python with AXL operations with values called 'class'
-                                # replace the variable names with 'classvalue' in Python, 
-                                # but still keep the dict key name as 'class' to send the correct name to AXL
-                                if n=="class":
-                                    axl_args.append(f'"{n}": {n}value') 
-                                else:
-                                    axl_args.append(f'"{n}": {n}')         
-                # customize 'update' operations
-                elif i.startswith("update"):
-                    for k in a.keys():
-                        # only explicitly add mandatory parameters to the method 
-                        # additional **kwargs will be added later in the script
-                        if interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['optional'] ==  False:
-                            axl_args.append(f'{k}={k}')
-                elif i.startswith("remove"):
-                    for k in a.keys():
-                        if a[k]=="":
-                            axl_args.append(f'{k}={k}')
-                        else:
-                            axl_args.append(f'{list(a.keys())[0]}={list(a.values())[0]}')
-                elif i.startswith("do"):
-                    for k in a.keys():
-                        if a[k]=="":
-                            axl_args.append(f'{k}={k}')
-                        elif "_value_1" in a[k]:
-                            axl_args.append(f'{k}={k}')
-                        else:
-                            axl_args.append(f'{list(a.keys())[0]}={list(a.values())[0]}')
-                elif i.startswith("apply"):
-                    for k in a.keys():
-                        if a[k]=="":
-                            axl_args.append(f'{k}={k}')
-                        else:
-                            axl_args.append(f'{list(a.keys())[0]}={list(a.values())[0]}')
-                elif i.startswith("restart"):
-                    for k in a.keys():
-                        if a[k]=="":
-                            axl_args.append(f'{k}={k}')
-                        else:
-                            axl_args.append(f'{list(a.keys())[0]}={list(a.values())[0]}')
-                elif i.startswith("reset"):
-                    for k in a.keys():
-                        if a[k]=="":
-                            axl_args.append(f'{k}={k}')
-                        else:
-                            axl_args.append(f'{list(a.keys())[0]}={list(a.values())[0]}')
-                elif i.startswith("lock"):
-                    for k in a.keys():
-                        if a[k]=="":
-                            axl_args.append(f'{k}={k}')
-                        else:
-                            axl_args.append(f'{list(a.keys())[0]}={list(a.values())[0]}')
-                elif i.startswith("wipe"):
-                    for k in a.keys():
-                        if a[k]=="":
-                            axl_args.append(f'{k}={k}')
-                        else:
-                            axl_args.append(f'{list(a.keys())[0]}={list(a.values())[0]}')
-                elif i.startswith("assign"):
-                    for k in a.keys():
-                        if a[k]=="":
-                            axl_args.append(f'{k}={k}')
-                        else:
-                            axl_args.append(f'{list(a.keys())[0]}={list(a.values())[0]}')
-                elif i.startswith("unassign"):
-                    for k in a.keys():
-                        if a[k]=="":
-                            axl_args.append(f'{k}={k}')
-                        else:
-                            axl_args.append(f'{list(a.keys())[0]}={list(a.values())[0]}')
-                elif i.startswith("execute"):
-                    for k in a.keys():
-                        if a[k]=="":
-                            axl_args.append(f'{k}={k}')
-                        else:
-                            axl_args.append(f'{list(a.keys())[0]}={list(a.values())[0]}')
-                else:
-                    axl_args.append(f'{list(a.keys())[0]}={list(a.values())[0]}')
-            # create a custom list of arguments for the method
-            # get list of top-level parameters excl. searchCriteria
-            args_reduced = [l for l in list(interface['AXLAPIService']['AXLPort']['operations'][i]['input'].keys()) if "searchCriteria" not in l]
-            args_new = []
-            # special treatment for the getNumDevices operation
-            if i.startswith("getNumDevices"):
-                args_new.append('deviceclass=""')
-            # for 'get' operations simply write **kwargs
-            # these operations will return all returnedTags by default
-            elif i.startswith("get"):
-                args_new.append('**kwargs')
-            # special treatment for the listChange operation
-            # ensures the first call of the operation is successful
-            elif i.startswith("listChange"):
-                args_new.append('startChangeId=None')
-            # for 'add' operations list all mandatory arguments only
-            elif i.startswith("add"):
-                for k in interface['AXLAPIService']['AXLPort']['operations'][i]['input'].keys():
-                    for m in interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'].keys():
-                        if interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['type'][m]['optional'] ==  False:
-                            if m=="class":
-                                args_new.append(f'{m}value=""')
-                            else:
-                                args_new.append(f'{m}=""')
-                        else:
-                            # fix issue in Python with AXL operations with values called 'class'
-                            # replace the variable names with 'classvalue'
-                            if m=="class":
-                                args_new.append(f'{m}value=None')
-                            else:
-                                args_new.append(f'{m}=None')
-            # for 'update' operations list all mandatory arguments only, and add **kwargs at the end
-            elif i.startswith("update"):
-                for k in interface['AXLAPIService']['AXLPort']['operations'][i]['input'].keys():
-                    if interface['AXLAPIService']['AXLPort']['operations'][i]['input'][k]['optional'] ==  False:
-                        args_new.append(f'{k}=""')
-                args_new.append(f'**kwargs')
+def is_any_type(entry_type):
+    return entry_type == ANY_TYPE
+
+
+def is_simple_type(entry_type):
+    return isinstance(entry_type, str) and entry_type in TYPES
+
+
+def emit_param(name, entry, depth, out):
+    # append the docstring lines of a parameter and its nested elements to out
+    # nested elements are documented down to the fourth level (depth 3),
+    # the elements of the third level (depth 2) don't get a line of their own, only their children do
+    indent = "    " * (depth + 2)
+    if depth == 0:
+        name = f":param {name}"
+    entry_type = entry.type
+    optional = entry.optional
+    if is_any_type(entry_type):
+        out.append(f"{indent}{name}: AnyType{', optional' if optional else ''}")
+    elif is_simple_type(entry_type):
+        out.append(f"{indent}{name}: {entry_type}{', optional' if optional else ''}")
+    elif depth < 3:
+        if depth < 2:
+            out.append(f"{indent}{name}: {'optional' if optional else ''}")
+        for sub_name, sub_entry in entry_type.items():
+            emit_param(sub_name, sub_entry, depth + 1, out)
+
+
+def emit_args(entry_type, depth=0):
+    # return "" for a simple type, or a dict with the arguments of the nested elements
+    # nested elements are included down to the third level (depth 2), complex types on that level are left out (None)
+    if is_any_type(entry_type) or is_simple_type(entry_type):
+        return ""
+    if depth == 2:
+        return None
+    args = {}
+    for sub_name, sub_entry in entry_type.items():
+        sub_args = emit_args(sub_entry.type, depth + 1)
+        if sub_args is not None:
+            args[sub_name] = sub_args
+    return args
+
+
+# customize 'list' operations
+def build_list_args(k, v, op_input, axl_args):
+    # use all returnedTags by default
+    if "returnedTags" in k:
+        axl_args.append("returnedTags=returnedTags")
+    # force searchCriteria to '%', thus always returning all values
+    elif "searchCriteria" in k:
+        for n in v:
+            v[n]="%"
+        axl_args.append(f'{v}')
+    elif v=="":
+        axl_args.append(f'{k}={k}')
+    else:
+        axl_args.append(f'{k}={v}')
+
+
+# customize 'add' operations
+def build_add_args(k, v, op_input, axl_args):
+    if v=="":
+        axl_args.append(f'{k}={k}')
+    else:
+        for n in v:
+            # fix issue in Python with AXL operations with values called 'class'
+            # replace the variable names with 'classvalue' in Python, 
+            # but still keep the dict key name as 'class' to send the correct name to AXL
+            if n=="class":
+                axl_args.append(f'"{n}": {n}value') 
             else:
-                for r in args_reduced:
-                    if "returnedTags" in r:
-                        args_new.append(f"returnedTags={tags['returnedTags']}")
-                    # make 'skip' and 'first' optional by setting them to None (return all values)
-                    # this still offers the possibility to overwrite them
-                    elif r=="skip":
-                        args_new.append(f'{r}=None')
-                    elif r=="first":
-                        args_new.append(f'{r}=None')
-                    else:
-                        args_new.append(f'{r}=""')
-            custom_args = ', '.join(args_new)
-            
-            #'write' the method to the file
-            print(f"    def {i}(self, {custom_args}):", file=f)
-            # 'write' docstring
-            print('        """', file=f)
-            for p in param:
-                print(f"{p}", file=f)
-            print('        """', file=f)
-            print("        try:", file=f)
-            # 'write' AXL call
-            # special treatment for 'getNumDevices' - nothing to unpack in the result
-            if i.startswith("getNumDevices"):
-                print(f'            return self.client.{i}(deviceclass)["return"]', file=f)
-            # special treatment for 'getOSVersion' - dict key called 'os' instead of 'oSVersion'
-            elif i.startswith("getOSVersion"):
-                print(f'            return self.client.{i}({", ".join(axl_args)})["return"]["os"]', file=f)
-            # special treatment for 'getCCMVersion' - nothing to unpack in the result
-            elif i.startswith("getCCMVersion"):
-                print(f'            return self.client.{i}(**kwargs)["return"]', file=f)
-            # special treatment for 'listChange' - only working with the startChangeId argument
-            elif i.startswith("listChange"):
-                print(f'            return self.client.{i}(startChangeId=startChangeId)', file=f)
-            # unpack result of 'list' operations. Capture empty results.
-            elif i.startswith("list"):
-                print(f'            returnvalue = self.client.{i}({", ".join(axl_args)})', file=f)
-                print(f'            return returnvalue["return"]["{element}"] if returnvalue["return"] else None', file=f)
-            # unpack result of 'get' operations
-            elif i.startswith("get"):
-                print(f'            return self.client.{i}(**kwargs)["return"]["{element}"]', file=f)
-            # for 'add' operations the arguments need to be send as dictionary
-            elif i.startswith("add"):
-                print(f'            return self.client.{i}('+'{'+f'{", ".join(axl_args)}'+'}'+f')["return"]', file=f)
-            elif i.startswith("update"):
-                if axl_args:
-                    print(f'            return self.client.{i}({", ".join(axl_args)}, **kwargs)["return"]', file=f)
+                axl_args.append(f'"{n}": {n}')         
+
+
+# customize 'update' operations
+def build_update_args(k, v, op_input, axl_args):
+    # only explicitly add mandatory parameters to the method 
+    # additional **kwargs will be added later in the script
+    if not op_input[k].optional:
+        axl_args.append(f'{k}={k}')
+
+
+def build_do_args(k, v, op_input, axl_args):
+    if v=="":
+        axl_args.append(f'{k}={k}')
+    elif "_value_1" in v:
+        axl_args.append(f'{k}={k}')
+    else:
+        axl_args.append(f'{k}={v}')
+
+
+# 'remove', 'apply', 'restart', 'reset', 'lock', 'wipe', 'assign', 'unassign', and 'execute' operations
+def build_args(k, v, op_input, axl_args):
+    if v=="":
+        axl_args.append(f'{k}={k}')
+    else:
+        axl_args.append(f'{k}={v}')
+
+
+def build_default_args(k, v, op_input, axl_args):
+    axl_args.append(f'{k}={v}')
+
+
+# argument builders by operation type, the part of the operation name before the first capital letter
+ARG_BUILDERS = {
+    "list": build_list_args,
+    "add": build_add_args,
+    "update": build_update_args,
+    "do": build_do_args,
+    "remove": build_args,
+    "apply": build_args,
+    "restart": build_args,
+    "reset": build_args,
+    "lock": build_args,
+    "wipe": build_args,
+    "assign": build_args,
+    "unassign": build_args,
+    "execute": build_args,
+}
+
+
+# kinds of methods rendered differently by templates/method.j2
+# the special kinds are matched by prefix of the operation name, e.g. executeSQLQueryInactive
+_SPECIAL_KINDS = ("getNumDevices", "getOSVersion", "getCCMVersion", "listChange", "executeSQLQuery")
+
+# all other operations are looked up by the operation type
+METHOD_KINDS = {
+    "list": "list",
+    "get": "get",
+    "add": "add",
+    "update": "update",
+}
+
+
+def method_kind(operation, verb):
+    for kind in _SPECIAL_KINDS:
+        if operation.startswith(kind):
+            return kind
+    return METHOD_KINDS.get(verb, "default")
+
+
+@lru_cache(maxsize=None)
+def load_method_template():
+    # the methods are rendered from templates/method.j2, the template is compiled once per process
+    # and its bytecode is kept in templates/.jinja_cache for the next runs
+    bytecode_dir = _TEMPLATE_DIR / ".jinja_cache"
+    bytecode_dir.mkdir(exist_ok=True)
+    env = Environment(
+        loader=FileSystemLoader(_TEMPLATE_DIR),
+        bytecode_cache=FileSystemBytecodeCache(str(bytecode_dir)),
+        trim_blocks=True,
+        keep_trailing_newline=True,
+    )
+    return env.get_template("method.j2")
+
+
+def render_method(i, operation, method_template):
+    #get element group name - used for unpacking the result object of (most) 'get' and 'list' operations
+    pos = _FIRST_UPPER(i).start() #find position of first capitalized letter
+    verb = i[:pos] #extract the operation type, e.g. 'list' or 'add'
+    element = i[pos].lower() + i[pos+1:] #extract element group name and turn first letter into lowercase
+    
+    # input parameters of the operation, bound once instead of re-indexing the interface dict
+    op_input = operation['input']
+
+    # get parameters for each operation - used for creating the docstrings
+    param = []
+    for k, k_entry in op_input.items():
+        emit_param(k, k_entry, 0, param)
+    # customize the arguments for the different operation types (add, get, list, etc.)
+    axl_args = []
+    tags = {}
+    arg_builder = ARG_BUILDERS.get(verb, build_default_args)
+    for k, k_entry in op_input.items():
+        # input arguments of the operation, "" for simple types or a dict of the nested arguments
+        v = emit_args(k_entry.type)
+        # extract all available returnedTags and store them separately
+        if k == "returnedTags":
+            tags = v
+        arg_builder(k, v, op_input, axl_args)
+    # create a custom list of arguments for the method
+    # get list of top-level parameters excl. searchCriteria
+    args_reduced = [l for l in op_input if "searchCriteria" not in l]
+    args_new = []
+    # special treatment for the getNumDevices operation
+    if i.startswith("getNumDevices"):
+        args_new.append('deviceclass=""')
+    # for 'get' operations simply write **kwargs
+    # these operations will return all returnedTags by default
+    elif i.startswith("get"):
+        args_new.append('**kwargs')
+    # special treatment for the listChange operation
+    # ensures the first call of the operation is successful
+    elif i.startswith("listChange"):
+        args_new.append('startChangeId=None')
+    # for 'add' operations list all mandatory arguments only
+    elif i.startswith("add"):
+        for k, k_entry in op_input.items():
+            for m, m_entry in k_entry.type.items():
+                # mandatory arguments default to "", optional ones to None
+                default = 'None' if m_entry.optional else '""'
+                # fix issue in Python with AXL operations with values called 'class'
+                # replace the variable names with 'classvalue'
+                if m=="class":
+                    args_new.append(f'{m}value={default}')
                 else:
-                    print(f'            return self.client.{i}(**kwargs)["return"]', file=f)
-            elif i.startswith("executeSQLQuery"):
-                print(f'            query_result = self.client.{i}({", ".join(axl_args)})["return"]', file=f)
-                print('            return [{element.tag: element.text for element in row} for row in query_result["row"]] if query_result else []', file=f)
+                    args_new.append(f'{m}={default}')
+    # for 'update' operations list all mandatory arguments only, and add **kwargs at the end
+    elif i.startswith("update"):
+        for k, k_entry in op_input.items():
+            if not k_entry.optional:
+                args_new.append(f'{k}=""')
+        args_new.append(f'**kwargs')
+    else:
+        for r in args_reduced:
+            if "returnedTags" in r:
+                args_new.append(f"returnedTags={tags}")
+            # make 'skip' and 'first' optional by setting them to None (return all values)
+            # this still offers the possibility to overwrite them
+            elif r=="skip":
+                args_new.append(f'{r}=None')
+            elif r=="first":
+                args_new.append(f'{r}=None')
             else:
-                print(f'            return self.client.{i}({", ".join(axl_args)})["return"]', file=f)
-            print("        except Fault as e:", file=f)
-            print("            return e", file=f)
-            print("", file=f)
+                args_new.append(f'{r}=""')
+    custom_args = ', '.join(args_new)
+    
+    #'write' the method to the file
+    return method_template.render(
+        name=i, args=custom_args, params=param, axl_args=axl_args, kind=method_kind(i, verb), element=element
+    )
+
+
+def render_chunk(items):
+    method_template = load_method_template()
+    return "".join(render_method(i, operation, method_template) for i, operation in items)
+
+
+def main():
+    axl_file = _HERE / "axl.py"
+    schema = load_wsdl_file(CUCM_VERSION)
+    interface = parse_service_interfaces(schema)
+
+    operations = list(interface['AXLAPIService']['AXLPort']['operations'].items())
+
+    # rendering all operations takes a few hundredths of a second, less than starting worker processes
+    methods = render_chunk(operations)
+
+    # axl.py is only opened once all methods are rendered, a failing run leaves the old file intact
+    # the 1 MB buffer holds the whole file, the parts are flushed once on close without joining them first
+    with open(axl_file, "w", buffering=1 << 20) as f:
+        # write the import to the file
+        f.write(write_imports() + "\n")
+        # write class to the file
+        f.write(write_class() + "\n")
+        f.write(methods)
 
 
 if __name__ == "__main__":
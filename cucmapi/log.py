@@ -1,13 +1,116 @@
-import re
-import requests
-import urllib3
-from pathlib import Path
-from requests import Session
-from requests.auth import HTTPBasicAuth
-from zeep import Client, Settings
-from zeep.cache import SqliteCache
-from zeep.exceptions import Fault
-from zeep.transports import Transport
+import struct
+import sys
+from email.message import Message
+from string import Template
+from xml.sax.saxutils import escape
+from lxml import etree
+from zeep.exceptions import Fault, TransportError
+from ._client import _get_connection, SOAP_ENV_NS
+from ._common import _UUID_PATTERN
+
+# GetOneFile belongs to the DimeGetFileService, which returns the file as an attachment (DIME, or MIME on
+# newer releases) zeep can't parse. The request is posted directly and the attachment is streamed, see GetOneFile()
+_GET_ONE_FILE_ENVELOPE = Template(
+    '<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns:ns="$ns">'
+    '<soapenv:Body><ns:GetOneFile soapenv:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">'
+    '<FileName>$file_name</FileName></ns:GetOneFile></soapenv:Body></soapenv:Envelope>'
+)
+
+# the attachment is read and written in chunks of 1 MB
+_CHUNK_SIZE = 1 << 20
+
+# connect and read timeout of GetOneFile, the read timeout applies to every chunk, not to the whole download
+_TIMEOUT = (10, 120)
+
+
+def _iter_attachment(response):
+    """
+    Return a generator of the content of the file attached to a GetOneFile response, chunk by chunk,
+    without reading the whole response. A response without attachment is a SOAP fault, it is raised as zeep Fault.
+    """
+    content_type = response.headers.get("Content-Type", "")
+    if content_type.startswith("application/dime"):
+        return _iter_dime(response.raw)
+    if content_type.startswith("multipart/related"):
+        header = Message()
+        header["Content-Type"] = content_type
+        return _iter_mime(response.iter_content(_CHUNK_SIZE), header.get_param("boundary").encode())
+    try:
+        fault = etree.fromstring(response.content).find(f".//{{{SOAP_ENV_NS}}}Fault")
+    except etree.XMLSyntaxError:
+        fault = None
+    if fault is not None:
+        raise Fault(message=fault.findtext("faultstring"), code=fault.findtext("faultcode"))
+    raise TransportError(status_code=response.status_code, content=response.content)
+
+
+def _iter_dime(stream):
+    """
+    Yield the data of the attachment records of a DIME message, the first record holds the SOAP envelope.
+    Every record starts with a 12 byte header with the flags and the lengths of its options, id, type and data,
+    each padded to a multiple of 4 bytes. Large attachments are split into chunked records.
+    """
+    envelope = True
+    while True:
+        flags, _, options_length, id_length, type_length, data_length = struct.unpack(">BBHHHI", _read(stream, 12))
+        _read(stream, _padded(options_length) + _padded(id_length) + _padded(type_length))
+        remaining = data_length
+        while remaining:
+            data = _read(stream, min(remaining, _CHUNK_SIZE))
+            remaining -= len(data)
+            if not envelope:
+                yield data
+        _read(stream, _padded(data_length) - data_length)
+        envelope = False
+        # ME flag, the last record of the message
+        if flags & 0x02:
+            return
+
+
+def _padded(length):
+    return (length + 3) & ~3
+
+
+def _read(stream, size):
+    """
+    Read exactly size bytes from the stream.
+    """
+    data = stream.read(size)
+    while len(data) < size:
+        more = stream.read(size - len(data))
+        if not more:
+            raise TransportError("incomplete DIME message")
+        data += more
+    return data
+
+
+def _iter_mime(chunks, boundary):
+    """
+    Yield the content of the second part of a multipart/related message, the first part holds the SOAP envelope.
+    The end of a chunk is held back if it might be the beginning of a delimiter split over two chunks.
+    """
+    delimiter = b"\r\n--" + boundary
+    chunks = iter(chunks)
+    # the first delimiter isn't preceded by a line break
+    buffer = b"\r\n"
+    # skip the preamble, the SOAP envelope and the headers of the attachment
+    for marker in (delimiter, delimiter, b"\r\n\r\n"):
+        while marker not in buffer:
+            buffer = buffer[-len(marker):] + _next_chunk(chunks)
+        buffer = buffer[buffer.index(marker) + len(marker):]
+    while delimiter not in buffer:
+        if len(buffer) > len(delimiter):
+            yield buffer[:-len(delimiter)]
+            buffer = buffer[-len(delimiter):]
+        buffer += _next_chunk(chunks)
+    yield buffer[:buffer.index(delimiter)]
+
+
+def _next_chunk(chunks):
+    chunk = next(chunks, None)
+    if chunk is None:
+        raise TransportError("incomplete multipart message")
+    return chunk
 
 
 class log(object):
@@ -17,40 +120,56 @@ class log(object):
     Tested with Python 3.8.10 and 3.9.5
     """
 
-    def __init__(self, username, password, cucm, cucm_version):
+    UUID_PATTERN = _UUID_PATTERN
+
+    # url and binding, the urls are formatted once per instance
+    _WSDL_FMT = "https://{cucm}:8443/logcollectionservice2/services/LogCollectionPortTypeService?wsdl"
+    _ADDRESS_FMT = "https://{cucm}:8443/logcollectionservice2/services/LogCollectionPortTypeService"
+    _BINDING = "{http://schemas.cisco.com/ast/soap}LogCollectionPortSoapBinding"
+    _DIME_WSDL_FMT = "https://{cucm}:8443/logcollectionservice/services/DimeGetFileService?wsdl"
+    _DIME_ADDRESS_FMT = "https://{cucm}:8443/logcollectionservice/services/DimeGetFileService"
+
+    def __init__(self, username, password, cucm, cucm_version, connection=None):
         """
         :param username: axl username
         :param password: axl password
         :param cucm: fqdn or IP address of CUCM
         :param cucm_version: CUCM version
+        :param connection: optional CucmConnection to share with other API classes.
+                           Defaults to the connection shared by all classes using the same CUCM and credentials
         """
 
-        wsdl = f"https://{cucm}:8443/logcollectionservice2/services/LogCollectionPortTypeService?wsdl"
-        
-        # create a session
-        session = Session()
-
-        # disable certificate verification and insecure request warnings
-        session.verify = False
-        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-        requests.packages.urllib3.disable_warnings( )
-
-        # to enable SSL cert verification, copy the CUCM tomcat .pem file and uncomment the following lines
-        # CERT = 'cucmtomcat.pem'
-        # session.verify = CERT
+        wsdl = sys.intern(self._WSDL_FMT.format(cucm=cucm))
+        address = sys.intern(self._ADDRESS_FMT.format(cucm=cucm))
 
-        session.auth = HTTPBasicAuth(username, password)
-        transport = Transport(session=session, timeout=10, cache=SqliteCache())
-        settings = Settings(strict=False, xml_huge_tree=True, xsd_ignore_sequence_order=True)
-        log_client = Client(wsdl, settings=settings, transport=transport) 
+        # the session and the parsed client are shared between instances, see CucmConnection
+        if connection is None:
+            connection = _get_connection(username, password, cucm, cucm_version)
+        log_client = connection.client(wsdl, self._BINDING)
 
-        self.wsdl = wsdl
+        self.wsdl = log_client.wsdl.location
         self.username = username
         self.password = password
         self.cucm = cucm
         self.cucm_version = cucm_version
-        self.UUID_PATTERN = re.compile(r"^[\da-f]{8}-([\da-f]{4}-){3}[\da-f]{12}$", re.IGNORECASE)
-        self.client = log_client.create_service("{http://schemas.cisco.com/ast/soap}LogCollectionPortSoapBinding", f"https://{cucm}:8443/logcollectionservice2/services/LogCollectionPortTypeService")
+        self.connection = connection
+        self.client = connection.service(wsdl, self._BINDING, address)
+        self._dime_wsdl_url = sys.intern(self._DIME_WSDL_FMT.format(cucm=cucm))
+        self._dime_address = sys.intern(self._DIME_ADDRESS_FMT.format(cucm=cucm))
+        self._get_one_file = None
+
+    def _get_one_file_operation(self):
+        """
+        Return the namespace and SOAPAction of GetOneFile, read from the DimeGetFileService WSDL on first use.
+        Callers that never download a file don't pay for fetching and parsing that WSDL.
+        """
+        if self._get_one_file is None:
+            dime_client = self.connection.client(self._dime_wsdl_url)
+            operation = next(
+                binding.get("GetOneFile") for binding in dime_client.wsdl.bindings.values() if "GetOneFile" in binding.all()
+            )
+            self._get_one_file = (operation.input.body.qname.namespace, operation.soapaction)
+        return self._get_one_file
 
     def listNodeServiceLogs(self):
         """
@@ -113,20 +232,37 @@ class log(object):
         except Fault as e:
             return e
 
-    def GetOneFile(self, file_name):
+    def GetOneFile(self, file_name, dest_path=None):
         """
         This method uses the DimeGetFileService API to retrieve either a server
         or system logfile through the standard Direct Internet Message Encapsulation
         (DIME) protocol.
 
         The selectLogFiles() method returns the absolute file name of log files.
+        The file is read from the response in chunks of 1 MB. With dest_path, every chunk
+        is written to disk as it arrives, so large trace files don't have to fit in memory.
 
         :param file_name: The absolute file name of the file to be collected
                 e.g. var/log/active/tomcat/logs/ccmservice/ccmservice00010.log
-        :return: bytes object 
+        :param dest_path: optional path of the local file the content is written to
+        :return: bytes object, or dest_path if it is given
         
         """
+        ns, soap_action = self._get_one_file_operation()
+        envelope = _GET_ONE_FILE_ENVELOPE.substitute(ns=ns, file_name=escape(file_name))
+        # the DIME records are read from the raw stream, which requests doesn't decompress
+        headers = {"Content-Type": "text/xml; charset=utf-8", "SOAPAction": f'"{soap_action}"', "Accept-Encoding": "identity"}
+
         try:
-            return self.client.GetOneFile(file_name)
+            with self.connection.session.post(
+                self._dime_address, data=envelope.encode("utf-8"), headers=headers, stream=True, timeout=_TIMEOUT
+            ) as response:
+                chunks = _iter_attachment(response)
+                if dest_path is None:
+                    return b"".join(chunks)
+                with open(dest_path, "wb") as file:
+                    for chunk in chunks:
+                        file.write(chunk)
+                return dest_path
         except Fault as e:
             return e
@@ -1,13 +1,8 @@
-import re
-import requests
-import urllib3
-from pathlib import Path
-from requests import Session
-from requests.auth import HTTPBasicAuth
-from zeep import Client, Settings
-from zeep.cache import SqliteCache
+import sys
+import time
 from zeep.exceptions import Fault
-from zeep.transports import Transport
+from ._client import _get_connection
+from ._common import _UUID_PATTERN
 
 
 class pfm(object):
@@ -26,40 +21,42 @@ class pfm(object):
     - perfmonCloseSession --> perfmonCloseSession
     """
 
-    def __init__(self, username, password, cucm, cucm_version):
+    UUID_PATTERN = _UUID_PATTERN
+
+    # url and binding, the urls are formatted once per instance
+    _WSDL_FMT = "https://{cucm}:8443/perfmonservice2/services/PerfmonService?wsdl"
+    _ADDRESS_FMT = "https://{cucm}:8443/perfmonservice2/services/PerfmonService"
+    _BINDING = "{http://schemas.cisco.com/ast/soap}PerfmonBinding"
+
+    # the PerfMon objects, counters and their descriptions rarely change, they are cached per instance for an hour
+    _METADATA_TTL = 3600
+
+    def __init__(self, username, password, cucm, cucm_version, connection=None):
         """
         :param username: axl username
         :param password: axl password
         :param cucm: fqdn or IP address of CUCM
         :param cucm_version: CUCM version
+        :param connection: optional CucmConnection to share with other API classes.
+                           Defaults to the connection shared by all classes using the same CUCM and credentials
         """
 
-        wsdl = f"https://{cucm}:8443/perfmonservice2/services/PerfmonService?wsdl"
-
-        # create a session
-        session = Session()
-
-        # disable certificate verification and insecure request warnings
-        session.verify = False
-        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-        requests.packages.urllib3.disable_warnings( )
-
-        # to enable SSL cert verification, copy the CUCM tomcat .pem file and uncomment the following lines
-        # CERT = 'cucmtomcat.pem'
-        # session.verify = CERT
+        wsdl = sys.intern(self._WSDL_FMT.format(cucm=cucm))
+        address = sys.intern(self._ADDRESS_FMT.format(cucm=cucm))
 
-        session.auth = HTTPBasicAuth(username, password)
-        transport = Transport(session=session, timeout=10, cache=SqliteCache())
-        settings = Settings(strict=False, xml_huge_tree=True, xsd_ignore_sequence_order=True) 
-        pfm_client = Client(wsdl, settings=settings, transport=transport) 
+        # the session and the parsed client are shared between instances, see CucmConnection
+        if connection is None:
+            connection = _get_connection(username, password, cucm, cucm_version)
+        pfm_client = connection.client(wsdl, self._BINDING)
 
-        self.wsdl = wsdl
+        self.wsdl = pfm_client.wsdl.location
         self.username = username
         self.password = password
         self.cucm = cucm
         self.cucm_version = cucm_version
-        self.UUID_PATTERN = re.compile(r"^[\da-f]{8}-([\da-f]{4}-){3}[\da-f]{12}$", re.IGNORECASE)
-        self.client = pfm_client.create_service("{http://schemas.cisco.com/ast/soap}PerfmonBinding", f"https://{cucm}:8443/perfmonservice2/services/PerfmonService")
+        self.connection = connection
+        self.client = connection.service(wsdl, self._BINDING, address)
+        self._metadata = {}
 
     def perfmonAddCounter(self, token, counters):
         """
@@ -81,16 +78,7 @@ class pfm(object):
         :param counters: list of a least one counter to be added to the session handle
         :return: none if successful
         """
-        counters_data = {
-                    "Counter": []
-        }
-
-        for counter in counters:
-            counters_data["Counter"].append(
-                {
-                    "Name": counter
-                }
-            )
+        counters_data = {"Counter": [{"Name": counter} for counter in counters]}
 
         try:
             return self.client.perfmonAddCounter(SessionHandle=token, ArrayOfCounter=counters_data)
@@ -140,17 +128,37 @@ class pfm(object):
         except Fault as e:
             return e
 
+    def perfmonPoll(self, token, interval, count):
+        """
+        Generator that collects the PerfMon data of a session every interval seconds, count times.
+        The polls are scheduled with a monotonic clock. If a request takes longer than the interval,
+        the next poll is sent right after it instead of catching up with the missed ones,
+        so there is never more than one request of the session in flight.
+
+        :param token: the unique session ID the 'perfmonOpenSession()' method returned
+        :param interval: seconds between two polls
+        :param count: number of polls
+        :return: generator of the results of 'perfmonCollectSessionData()'
+        """
+        next_poll = time.monotonic()
+        for _ in range(count):
+            now = time.monotonic()
+            if now < next_poll:
+                time.sleep(next_poll - now)
+            yield self.perfmonCollectSessionData(token)
+            next_poll = max(next_poll + interval, time.monotonic())
+
     def perfmonListCounter(self, host):
         """
         This method returns the list of available PerfMon objects and counters 
         on a particular host.
-        No session needed.
+        No session needed. The result is cached for an hour.
 
         :param host: Host name from which to retrieve counter information
         :return: result list
         """
         try:
-            return self.client.perfmonListCounter(Host=host)
+            return self._cached(("perfmonListCounter", host), lambda: self.client.perfmonListCounter(Host=host))
         except Fault as e:
             return e
 
@@ -186,7 +194,7 @@ class pfm(object):
     def perfmonQueryCounterDescription(self, counter_name):
         """
         Returns the detailed, human-readable description of the requested counter.
-        No session needed.
+        No session needed. The result is cached for an hour.
 
         Use 'perfmonListCounter()' method to get possible counters for an object.
         Use 'perfmonListInstance()' method to get possible instances for an object.
@@ -204,7 +212,10 @@ class pfm(object):
         :result: string
         """
         try:
-            return self.client.perfmonQueryCounterDescription(Counter=counter_name)
+            return self._cached(
+                ("perfmonQueryCounterDescription", counter_name),
+                lambda: self.client.perfmonQueryCounterDescription(Counter=counter_name)
+            )
         except Fault as e:
             return e
       
@@ -228,18 +239,21 @@ class pfm(object):
         :param counters: list of a least one counter to be added to the session handle
         :return: none if successful
         """
-        counters_data = {
-                    "Counter": []
-        }
-
-        for counter in counters:
-            counters_data["Counter"].append(
-                {
-                    "Name": counter
-                }
-            )
+        counters_data = {"Counter": [{"Name": counter} for counter in counters]}
 
         try:
             return self.client.perfmonRemoveCounter(SessionHandle=token, ArrayOfCounter=counters_data)
         except Fault as e:
             return e
+
+    def _cached(self, key, request):
+        """
+        Return the cached result of a metadata request, or send the request and cache its result.
+        Faults are raised by request() and never cached.
+        """
+        cached = self._metadata.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        result = request()
+        self._metadata[key] = (time.monotonic() + self._METADATA_TTL, result)
+        return result
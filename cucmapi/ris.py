@@ -1,13 +1,77 @@
-import re
-import requests
-import urllib3
-from pathlib import Path
-from requests import Session
-from requests.auth import HTTPBasicAuth
-from zeep import Client, Settings
-from zeep.cache import SqliteCache
+import asyncio
+import json
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from string import Template
+from xml.sax.saxutils import escape
 from zeep.exceptions import Fault
-from zeep.transports import Transport
+from zeep.helpers import serialize_object
+from ._client import _get_connection, _typed_record, _xsd_fields
+from ._common import _UUID_PATTERN
+
+# orjson is an optional dependency, it serializes large device lists several times faster than json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# prebuilt SOAP envelope of selectCmDeviceExt, posted without zeep, see CucmConnection.post_soap()
+_SELECT_ENVELOPE = Template(
+    '<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns:ns="$ns">'
+    '<soapenv:Body><ns:selectCmDeviceExt><ns:StateInfo></ns:StateInfo>'
+    '<ns:CmSelectionCriteria>$criteria</ns:CmSelectionCriteria></ns:selectCmDeviceExt></soapenv:Body></soapenv:Envelope>'
+)
+
+
+# template of the CmSelectionCriteria of selectCmDeviceExt, copied and filled in per request
+# the keys are in the order of the schema, the prebuilt envelope renders them in this order
+_CM_SELECTION_TMPL = {
+    "MaxReturnedDevices": "1000",
+    "DeviceClass": None,
+    "Model": 255,
+    "Status": None,
+    "NodeName": None,
+    "SelectBy": "Name",
+    "SelectItems": None,
+    "Protocol": "Any",
+    "DownloadStatus": "Any",
+}
+
+
+def _criteria_xml(criteria):
+    """
+    Render the (nested) dict of a CmSelectionCriteria as the elements of the SOAP envelope.
+    Fields that are None are left out, e.g. NodeName to query all nodes.
+    """
+    return "".join(
+        f"<ns:{name}>{_criteria_xml(value) if isinstance(value, dict) else escape(str(value))}</ns:{name}>"
+        for name, value in criteria.items() if value is not None
+    )
+
+
+def _parse_cm_devices(output, as_dict=False):
+    """
+    This parser function extracts all the device information from the 
+    SelectCMDeviceExt method's response. It will create a list containing
+    dictionaries for each device, an empty list if no device was found
+    With as_dict, the Records are converted to plain dicts once, here.
+    The fields are read by key only, which works the same for zeep objects and Records.
+    """
+    # CmNodes is nil if no device was found (TotalDevicesFound is 0)
+    nodes = output['CmNodes']
+    if not nodes:
+        return []
+    devices = [device for node in nodes['item'] for device in node['CmDevices']['item']]
+    return [serialize_object(device, dict) for device in devices] if as_dict else devices
+
+
+def _limit(devices, n=1000): 
+    """
+    this function turns large phone lists into chunks of n, 1000 by default
+    """
+    return [devices[i: i + n] for i in range(0, len(devices), n)]
 
 
 class ris(object):
@@ -16,50 +80,70 @@ class ris(object):
     Tested with Python 3.8.10 and 3.9.5
     """
 
-    def __init__(self, username, password, cucm, cucm_version):
+    UUID_PATTERN = _UUID_PATTERN
+
+    # url and binding, the urls are formatted once per instance
+    _WSDL_FMT = "https://{cucm}:8443/realtimeservice2/services/RISService70?wsdl"
+    _ADDRESS_FMT = "https://{cucm}:8443/realtimeservice2/services/RISService70"
+    _BINDING = "{http://schemas.cisco.com/ast/soap}RisBinding"
+
+    # concurrent requests of selectCmDeviceExt() and selectCtiItem(), within the pool size of the connection's session
+    _MAX_WORKERS = 8
+
+    def __init__(self, username, password, cucm, cucm_version, connection=None):
         """
 		:param username: axl username
 		:param password: axl password
 		:param cucm: fqdn or IP address of CUCM
 		:param cucm_version: CUCM version
+		:param connection: optional CucmConnection to share with other API classes.
+		                   Defaults to the connection shared by all classes using the same CUCM and credentials
 		"""
 
-        wsdl = f"https://{cucm}:8443/realtimeservice2/services/RISService70?wsdl"
-
-        # create a session
-        session = Session()
-
-        # disable certificate verification and insecure request warnings
-        session.verify = False
-        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-        requests.packages.urllib3.disable_warnings( )
-
-        # to enable SSL cert verification, copy the CUCM tomcat .pem file and uncomment the following lines
-        # CERT = 'cucmtomcat.pem'
-        # session.verify = CERT
+        wsdl = sys.intern(self._WSDL_FMT.format(cucm=cucm))
+        address = sys.intern(self._ADDRESS_FMT.format(cucm=cucm))
 
-        session.auth = HTTPBasicAuth(username, password)
-        transport = Transport(session=session, timeout=10, cache=SqliteCache())
-        settings = Settings(strict=False, xml_huge_tree=True, xsd_ignore_sequence_order=True) 
-        ris_client = Client(wsdl, settings=settings, transport=transport) 
+        # the session and the parsed client are shared between instances, see CucmConnection
+        if connection is None:
+            connection = _get_connection(username, password, cucm, cucm_version)
+        ris_client = connection.client(wsdl, self._BINDING)
 
-        self.wsdl = wsdl
+        self.wsdl = ris_client.wsdl.location
         self.username = username
         self.password = password
         self.cucm = cucm
         self.cucm_version = cucm_version
-        self.UUID_PATTERN = re.compile(r"^[\da-f]{8}-([\da-f]{4}-){3}[\da-f]{12}$", re.IGNORECASE)
-        self.client = ris_client.create_service("{http://schemas.cisco.com/ast/soap}RisBinding", f"https://{cucm}:8443/realtimeservice2/services/RISService70")
+        self.connection = connection
+        self.client = connection.service(wsdl, self._BINDING, address)
+        self._wsdl_url = wsdl
+        self._address = address
+        self._client_async = None
+        # selectCmDeviceExt posts its envelope directly and parses the response without zeep,
+        # converting the values with the types defined in the WSDL
+        operation = ris_client.wsdl.bindings[self._BINDING].get("selectCmDeviceExt")
+        self._select_ns = operation.input.body.qname.namespace
+        self._select_action = operation.soapaction
+        # the fields of the only child of the response, selectCmDeviceReturn
+        (self._select_fields, _), = _xsd_fields(operation.output.body.type).values()
+
+    @property
+    def client_async(self):
+        """
+        zeep service for the asyncio methods, created on first use. Requires the optional httpx package.
+        """
+        if self._client_async is None:
+            self._client_async = self.connection.async_service(self._wsdl_url, self._BINDING, self._address)
+        return self._client_async
 
 
     def get_cm_device_ext(self, **args):
         """
         Runner function to get registration information using the 
-        SelectCMDeviceExt method from the RisPort70 API. 
-        This function is called by and gets its arguments from 'selectCmDeviceExt()'
+        SelectCMDeviceExt method from the RisPort70 API, through zeep.
+        selectCmDeviceExt() doesn't call it, it posts a prebuilt request instead.
 
-        To call this function directly, the entire CmSelectionCriteria SOAP 
-        request body needs to be provided as argument.
+        The entire CmSelectionCriteria SOAP request body needs to be provided as argument.
+        Returns the zeep objects of SelectCmDeviceResult and StateInfo.
         https://developer.cisco.com/docs/sxml/#!risport70-api-reference/selectcmdeviceext
         """
         try:
@@ -89,7 +173,7 @@ class ris(object):
             print(e)
             return e
 
-    def selectCmDeviceExt(self, devices, subs, device_class="Phone", status="Any"):
+    def selectCmDeviceExt(self, devices, subs, device_class="Phone", status="Any", as_dict=False, chunk_size=1000):
         """
         Get registration information for various device types using the 
         SelectCMDeviceExt method from the RisPort70 API.
@@ -99,7 +183,10 @@ class ris(object):
         :param subs: list of call processing subscribers to check against or None (=all nodes)
         :param device_class: target device type. Defaults to "Phone"
         :param status: target device registration status. Defaults to "Any"
-        :return: result list
+        :param as_dict: return the devices as plain dicts instead of Records. Defaults to False
+        :param chunk_size: number of devices per request, at most 1000 (the API maximum). Defaults to 1000
+        :return: result list, the devices are Records (dicts with attribute access) parsed without zeep
+        :raises Fault: if the API returns a SOAP fault
 
         Input values for device_class:
             "Any", "Phone", "Gateway", "H323", "Cti", "VoiceMail", 
@@ -110,26 +197,112 @@ class ris(object):
             "PartiallyRegistered", "Unknown"
         """
 
-        def parse(output):
-            """
-            This parser function extracts all the device information from the 
-            SelectCMDeviceExt method's response. It will create a list containing
-            dictionaries for each device
-            """
-            devices = []
-            if output['CmNodes'] is not None:
-                for node in output.CmNodes.item:
-                    for device in node.CmDevices.item:
-                        devices.append(device)
-                return devices
-            else: 
-                return
-        
-        def limit(devices, n=1000): 
-            """
-            this function turns large phone lists into chunks of 1000
-            """
-            return [devices[i: i + n] for i in range(0, len(devices), n)]
+        return list(self.iselectCmDeviceExt(devices, subs, device_class, status, as_dict, chunk_size))
+
+    def iselectCmDeviceExt(self, devices, subs, device_class="Phone", status="Any", as_dict=False, chunk_size=1000):
+        """
+        Generator variant of selectCmDeviceExt(). The devices are yielded response by response
+        instead of collecting all of them in a list first, e.g. to write them to a CSV file or a database.
+        The arguments are validated right away, not on the first iteration.
+
+        :param devices: list of devices to check the registration info for
+        :param subs: list of call processing subscribers to check against or None (=all nodes)
+        :param device_class: target device type. Defaults to "Phone"
+        :param status: target device registration status. Defaults to "Any"
+        :param as_dict: return the devices as plain dicts instead of Records. Defaults to False
+        :param chunk_size: number of devices per request, at most 1000 (the API maximum). Defaults to 1000
+        :return: generator of devices, see selectCmDeviceExt()
+        :raises Fault: if the API returns a SOAP fault, when the devices are iterated
+        """
+
+        criteria_list = self._cm_selection_criteria(devices, subs, device_class, status, chunk_size)
+
+        def select(criteria):
+            # the response of large clusters is big, it is parsed with lxml instead of zeep
+            response = self.connection.post_soap(self._address, self._select_envelope(criteria), self._select_action)
+            # send output to the parser function and return clean ouput
+            return self._parse_select(response, as_dict)
+
+        def generate():
+            # the requests are I/O bound, run them concurrently over the pooled session
+            # at most _MAX_WORKERS requests are in flight, the next one is submitted when the oldest is consumed,
+            # so only a window of responses is held in memory; the results keep the order of the requests
+            remaining = iter(criteria_list)
+            with ThreadPoolExecutor(max_workers=self._MAX_WORKERS) as executor:
+                window = deque(executor.submit(select, criteria) for criteria in islice(remaining, self._MAX_WORKERS))
+                try:
+                    while window:
+                        output = window.popleft().result()
+                        for criteria in islice(remaining, 1):
+                            window.append(executor.submit(select, criteria))
+                        yield from output
+                finally:
+                    # the caller stopped early or a request failed, don't send the requests that haven't started
+                    for future in window:
+                        future.cancel()
+
+        return generate()
+
+    async def selectCmDeviceExt_async(self, devices, subs, device_class="Phone", status="Any", as_dict=False, chunk_size=1000):
+        """
+        asyncio variant of selectCmDeviceExt(). Requires the optional httpx package.
+        The requests of all Subscribers and groups are sent concurrently with asyncio.gather().
+        The responses are parsed without zeep, like those of selectCmDeviceExt().
+
+        :param devices: list of devices to check the registration info for
+        :param subs: list of call processing subscribers to check against or None (=all nodes)
+        :param device_class: target device type. Defaults to "Phone"
+        :param status: target device registration status. Defaults to "Any"
+        :param as_dict: return the devices as plain dicts instead of Records. Defaults to False
+        :param chunk_size: number of devices per request, at most 1000 (the API maximum). Defaults to 1000
+        :return: result list, the devices are Records (dicts with attribute access) parsed without zeep
+        :raises Fault: if the API returns a SOAP fault
+        """
+
+        calls = [
+            self.connection.post_soap_async(self._address, self._select_envelope(criteria), self._select_action)
+            for criteria in self._cm_selection_criteria(devices, subs, device_class, status, chunk_size)
+        ]
+        responses = await asyncio.gather(*calls)
+
+        registered = []
+        for response in responses:
+            registered.extend(self._parse_select(response, as_dict))
+        return registered
+
+    @staticmethod
+    def to_json(devices):
+        """
+        Serialize the devices returned by selectCmDeviceExt() to JSON, e.g. to write them to a file or a queue.
+        Uses orjson if it is installed, json otherwise. zeep objects are converted to dicts first.
+
+        :param devices: list of devices
+        :return: JSON document (bytes)
+        """
+        devices = [device if isinstance(device, dict) else serialize_object(device, dict) for device in devices]
+        if orjson is not None:
+            return orjson.dumps(devices)
+        return json.dumps(devices, separators=(",", ":")).encode()
+
+    def _select_envelope(self, criteria):
+        """
+        Render the SOAP envelope of a selectCmDeviceExt request, see _cm_selection_criteria().
+        """
+        return _SELECT_ENVELOPE.substitute(ns=self._select_ns, criteria=_criteria_xml(criteria))
+
+    def _parse_select(self, response, as_dict=False):
+        """
+        Convert the response element of selectCmDeviceExt with the types of the WSDL and return its devices.
+        """
+        output_raw = _typed_record(response[0], self._select_fields)["SelectCmDeviceResult"]
+        return _parse_cm_devices(output_raw, as_dict)
+
+    def _cm_selection_criteria(self, devices, subs, device_class, status, chunk_size=1000):
+        """
+        Validate the arguments of selectCmDeviceExt() and return the SOAP request body of every
+        request, one per group of chunk_size devices and Subscriber. Every request gets its own copy,
+        the requests are sent concurrently and must not share it.
+        """
 
         # define available device classes as per API documentation
         # https://developer.cisco.com/docs/sxml/#!risport70-api-reference/selectcmdevice
@@ -143,69 +316,27 @@ class ris(object):
                 "Any", "Registered", "UnRegistered", "Rejected", 
                 "PartiallyRegistered", "Unknown"
         )
-        # prepare request SOAP body to send to CUCM using zeep
-        CmSelectionCriteria = {
-            "MaxReturnedDevices": "1000",
-            "DeviceClass": "",
-            "Model": 255,
-            "Status": "",
-            "NodeName": "",
-            "SelectBy": "Name",
-            "SelectItems": {
-                "item": {
-                    "Item": ""
-                }
-            },
-            "Protocol": "Any",
-            "DownloadStatus": "Any"
-        }
-        # update DeviceClass in SOAP body and raise exception if content is invalid
-        if device_class in device_classes:
-            CmSelectionCriteria["DeviceClass"] = device_class
-        else:
+        # raise exception if DeviceClass is invalid
+        if device_class not in device_classes:
             raise ValueError(f"device_class needs to contain one of the following:\n{device_classes}")    
-        # update Status in SOAP body and raise exception if content is invalid
-        if status in state_values:
-            CmSelectionCriteria['Status'] = status
-        else:
+        # raise exception if Status is invalid
+        if status not in state_values:
             raise ValueError(f"status needs to contain of the following:\n{state_values}")
+        # the API returns at most 1000 devices per request
+        if not 0 < chunk_size <= 1000:
+            raise ValueError("chunk_size needs to be between 1 and 1000")
 
-        # prepare return object (list) for later
-        registered = []
-        # divide device list into chucks of 1000 - only relevant if +1000 devices
-        groups = limit(devices)
-
-        for group in groups:
-        # loop through Subscrbers and retrieve registration information for all devices
-            if subs:
-                for sub in subs:
-                    # update NodeName in SOAP body with Subscriber's name
-                    CmSelectionCriteria['NodeName'] = sub
-                    # add all devices of the current group to the SOAP body
-                    CmSelectionCriteria['SelectItems']['item']['Item'] = ",".join(group)
-                    output_raw, state_info = self.get_cm_device_ext(**CmSelectionCriteria)
-                    # if there are no devices in the ouput - skip
-                    # otherwise, send output to the parser function and return clean ouput
-                    if output_raw['TotalDevicesFound'] <1:
-                        continue
-                    else:
-                        output = parse(output_raw)
-                    registered.extend(output)
-            else:
-                # update NodeName in SOAP body with Subscriber's name
-                CmSelectionCriteria['NodeName'] = None
-                # add all devices of the current group to the SOAP body
-                CmSelectionCriteria['SelectItems']['item']['Item'] = ",".join(group)
-                output_raw, state_info = self.get_cm_device_ext(**CmSelectionCriteria)
-                # if there are no devices in the ouput - skip
-                # otherwise, send output to the parser function and return clean ouput
-                if output_raw['TotalDevicesFound'] <1:
-                    continue
-                else:
-                    output = parse(output_raw)
-                registered.extend(output)
-        
-        return registered
+        # update DeviceClass and Status in a copy of the SOAP body template
+        CmSelectionCriteria = {**_CM_SELECTION_TMPL, "DeviceClass": device_class, "Status": status}
+        criteria_list = []
+        # divide device list into chucks of chunk_size - only relevant if +chunk_size devices
+        for group in _limit(devices, chunk_size):
+            # the device names are joined once per group, all nodes are queried at once if no Subscribers are given
+            joined = ",".join(group)
+            for sub in (subs or [None]):
+                # update NodeName with Subscriber's name and add all devices of the group
+                criteria_list.append({**CmSelectionCriteria, "NodeName": sub, "SelectItems": {"item": {"Item": joined}}})
+        return criteria_list
 
     def selectCtiItem(self, devices, subs, cti_mgr_class="Line", status="Any"):
         """
@@ -216,16 +347,10 @@ class ris(object):
             """
             This parser function extracts all the device information from the 
             SelectCtiItem method's response. It will create a list containing
-            dictionaries for each device
+            dictionaries for each device, an empty list if no device was found
             """
-            devices = []
-            if output['CtiNodes'] is not None:
-                for node in output.CtiNodes.item:
-                    for device in node.CtiItems.item:
-                        devices.append(device)
-                return devices
-            else: 
-                return
+            nodes = output['CtiNodes']
+            return [device for node in nodes['item'] for device in node['CtiItems']['item']] if nodes else []
 
         # define available CtiMgrClass values as per API documentation
         # https://developer.cisco.com/docs/sxml/#!risport70-api-reference/selectctiitem
@@ -271,19 +396,17 @@ class ris(object):
         else:
             raise ValueError(f"status needs to contain of the following:\n{state_values}")
 
-        # loop through Subscrbers and retrieve registration information for all devices
-        for sub in subs:
-            # update NodeName in SOAP body with Subscriber's name
-            CtiSelectionCriteria['NodeName'] = sub
-            # add all devices to the SOAP body
-            CtiSelectionCriteria['DevNames']['item']['DevName'] = ",".join(devices)
-            output_raw, state_info = self.get_cti_item(**CtiSelectionCriteria)
-            # if there are not devices in the ouput - skip
-            # otherwise, send output to the parser function and return clean ouput
-            if output_raw['TotalDevicesFound'] <1:
-                continue
-            else:
-                output = parse(output_raw)
-            cti_status.extend(output)
+        def select(sub):
+            # every request gets its own copy of the SOAP body, the threads must not share it
+            # update NodeName with Subscriber's name and add all devices
+            criteria = dict(CtiSelectionCriteria, NodeName=sub, DevNames={"item": {"DevName": ",".join(devices)}})
+            output_raw, state_info = self.get_cti_item(**criteria)
+            # send output to the parser function and return clean ouput
+            return parse(output_raw), state_info
+
+        # loop through Subscrbers and retrieve registration information for all devices, concurrently
+        with ThreadPoolExecutor(max_workers=self._MAX_WORKERS) as executor:
+            for output, state_info in executor.map(select, subs):
+                cti_status.extend(output)
 
         return cti_status, state_info
@@ -0,0 +1,145 @@
+import importlib
+import struct
+from io import BytesIO
+
+import pytest
+from zeep.exceptions import Fault, TransportError
+
+from cucmapi.log import _iter_attachment, _iter_dime, _iter_mime
+
+# the class log is re-exported by the package and shadows the module attribute
+log_module = importlib.import_module("cucmapi.log")
+
+ENVELOPE = (
+    b'<?xml version="1.0" encoding="UTF-8"?><soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">'
+    b'<soapenv:Body><ns1:GetOneFileResponse xmlns:ns1="http://schemas.cisco.com/ast/soap"/></soapenv:Body></soapenv:Envelope>'
+)
+BOUNDARY = b"MIMEBoundaryurn_uuid_0123"
+# the content starts and ends with partial delimiters, which must not end the attachment
+CONTENT = b"\r\n--" + BOUNDARY[:-1] + bytes(range(256)) * 3 + b"\r\n--" + BOUNDARY[:5]
+
+
+def _padded(data):
+    return data + b"\0" * (-len(data) % 4)
+
+
+def _dime_record(flags, data, type_=b""):
+    # version 1, type name format 'media type' for the first record of a payload, 'unchanged' for the chunks
+    header = struct.pack(">BBHHHI", 1 << 3 | flags, (1 if type_ else 0) << 4, 0, 0, len(type_), len(data))
+    return header + _padded(type_) + _padded(data)
+
+
+def _dime_message(parts):
+    """
+    DIME message with the SOAP envelope in the first record and the attachment in chunked records.
+    """
+    message = _dime_record(0x04, ENVELOPE, b"http://schemas.xmlsoap.org/soap/envelope/")
+    for n, part in enumerate(parts):
+        last = n == len(parts) - 1
+        message += _dime_record(0x02 if last else 0x01, part, b"application/octet-stream" if n == 0 else b"")
+    return message
+
+
+def _mime_message(content):
+    return (
+        b"--" + BOUNDARY + b"\r\nContent-Type: text/xml; charset=UTF-8\r\nContent-ID: <root>\r\n\r\n" + ENVELOPE
+        + b"\r\n--" + BOUNDARY + b"\r\nContent-Type: application/octet-stream\r\nContent-ID: <file>\r\n\r\n" + content
+        + b"\r\n--" + BOUNDARY + b"--\r\n"
+    )
+
+
+class ShortReads(BytesIO):
+    """
+    Stream that returns at most size bytes per read, like a socket.
+    """
+
+    def __init__(self, data, size):
+        super().__init__(data)
+        self.size = size
+
+    def read(self, size=-1):
+        return super().read(min(size, self.size) if size >= 0 else self.size)
+
+
+class FakeResponse:
+    def __init__(self, content_type, body, status_code=200):
+        self.headers = {"Content-Type": content_type}
+        self.content = body
+        self.raw = BytesIO(body)
+        self.status_code = status_code
+
+    def iter_content(self, chunk_size):
+        return (self.content[n:n + chunk_size] for n in range(0, len(self.content), chunk_size))
+
+
+def test_dime_single_record():
+    message = _dime_message([CONTENT])
+    assert b"".join(_iter_dime(BytesIO(message))) == CONTENT
+
+
+def test_dime_chunked_records():
+    # chunks of odd sizes, so every record is padded
+    parts = [CONTENT[:5], CONTENT[5:306], CONTENT[306:]]
+    message = _dime_message(parts)
+    assert b"".join(_iter_dime(BytesIO(message))) == CONTENT
+    assert b"".join(_iter_dime(ShortReads(message, 7))) == CONTENT
+
+
+def test_dime_records_larger_than_chunk_size(monkeypatch):
+    monkeypatch.setattr(log_module, "_CHUNK_SIZE", 64)
+    message = _dime_message([CONTENT[:500], CONTENT[500:]])
+    chunks = list(_iter_dime(ShortReads(message, 13)))
+    assert b"".join(chunks) == CONTENT
+    assert max(len(chunk) for chunk in chunks) <= 64
+
+
+def test_dime_empty_attachment():
+    assert b"".join(_iter_dime(BytesIO(_dime_message([b""])))) == b""
+
+
+def test_dime_incomplete_message():
+    message = _dime_message([CONTENT])
+    with pytest.raises(TransportError):
+        b"".join(_iter_dime(BytesIO(message[:-20])))
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, len(BOUNDARY), len(BOUNDARY) + 4, 100, 1 << 20])
+def test_mime_chunks(size):
+    message = _mime_message(CONTENT)
+    chunks = [message[n:n + size] for n in range(0, len(message), size)]
+    assert b"".join(_iter_mime(chunks, BOUNDARY)) == CONTENT
+
+
+def test_mime_delimiter_split_across_chunks():
+    # split the message once at every position, i.e. also inside each of the delimiters
+    message = _mime_message(CONTENT)
+    for n in range(1, len(message)):
+        assert b"".join(_iter_mime([message[:n], message[n:]], BOUNDARY)) == CONTENT, n
+
+
+def test_mime_empty_attachment():
+    assert b"".join(_iter_mime([_mime_message(b"")], BOUNDARY)) == b""
+
+
+def test_mime_incomplete_message():
+    message = _mime_message(CONTENT)
+    with pytest.raises(TransportError):
+        b"".join(_iter_mime([message[:-len(BOUNDARY) - 10]], BOUNDARY))
+
+
+def test_attachment_content_types():
+    dime = FakeResponse("application/dime", _dime_message([CONTENT[:100], CONTENT[100:]]))
+    assert b"".join(_iter_attachment(dime)) == CONTENT
+    content_type = f'multipart/related; type="text/xml"; start="<root>"; boundary="{BOUNDARY.decode()}"'
+    mime = FakeResponse(content_type, _mime_message(CONTENT))
+    assert b"".join(_iter_attachment(mime)) == CONTENT
+
+
+def test_attachment_fault():
+    body = (
+        b'<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/"><soapenv:Body><soapenv:Fault>'
+        b"<faultcode>soapenv:Server</faultcode><faultstring>File not found</faultstring>"
+        b"</soapenv:Fault></soapenv:Body></soapenv:Envelope>"
+    )
+    with pytest.raises(Fault, match="File not found"):
+        _iter_attachment(FakeResponse("text/xml; charset=utf-8", body, 500))